@@ -13,10 +13,38 @@
 # Requirements Satisfied by This Program:
 #
 # Usage:
-#	strainalleleload.py
+#	strainalleleload.py [--profile] [--progress=SECONDS] [--coordinate]
+#		[--slowquery=MS] [--lookupd=SOCKET]
+#
+#	--profile: run under cProfile; writes <input>.<date>.profile
+#	and a summary <input>.<date>.profile.txt next to the diagnostics file
+#
+#	--progress=SECONDS: status file update interval (default 10, 0 = off);
+#	the status file is <input>.<date>.status, also written on SIGUSR1
+#
+#	--coordinate: lease the PRB_Strain_Marker key range, so that
+#	several coordinated loaders may run at once (see strainkeys.py)
+#
+#	--slowquery=MS: write statements taking at least MS milliseconds,
+#	with their templates, parameters and plans, to
+#	<input>.<date>.slowqueries (see strainslowquery.py)
+#
+#	--lookupd=SOCKET: take the lookups from the lookup daemon
+#	listening on SOCKET, and send it the lookups this load makes
+#	(see strainlookupd.py); without a daemon, the load goes on alone
+#
+#	or, from another load (see StrainAlleleLoader):
+#
+#	import strainalleleload, strainloadlib
+#	config = strainloadlib.StrainLoadConfig(user, passwordFileName, inputFileName)
+#	strainalleleload.StrainAlleleLoader(config, connection = db, cache = cache).run(records)
 #
 # Envvars:
 #
+#	MGD_DBUSER
+#	MGD_DBPASSWORDFILE
+#	STRAININPUTFILE
+#
 # Inputs:
 #
 #	A tab-delimited file in the format:
@@ -25,6 +53,10 @@
 #		field 3: Qualifier
 #		field 4: Created By
 #
+#	The file may be gzip (.gz), bzip2 (.bz2) or xz (.xz) compressed,
+#	or a Parquet (.parquet) or Arrow (.arrow, .feather) file with
+#	the same fields as its first columns (see strainloadlib.RecordReader).
+#
 # Outputs:
 #
 #       1 BCP files:
@@ -38,7 +70,8 @@
 #
 # Assumes:
 #
-#	That no one else is adding records to the database.
+#	That no one else is adding records to the database,
+#	unless all loaders run with --coordinate (see strainkeys.py).
 #
 # Bugs:
 #
@@ -46,131 +79,335 @@
 #
 # History
 #
+# 10/19/2026	agent
+#	- StrainAlleleLoader class; importable with an existing connection,
+#	  a warm LookupCache and an iterator of records
+#	- --profile option
+#	- compressed, Parquet/Arrow and mmap input (RecordReader)
+#	- --progress option; status file
+#	- bcp file is written in primary key order (strainbcp.SortedBCPFile)
+#	- --coordinate option
+#	- --slowquery option
+#	- --lookupd option
+#
 # 02/09/2006	lec
 #	- new, for JRS cutover; uses JRS format (for now)
 #
 
 import sys
 import os
-import db
-import mgi_utils
-import loadlib
+import strainloadlib
+import strainbcp
 
-#globals
+# db, mgi_utils and loadlib are imported by StrainAlleleLoader
+# (see loadModules()) so that importing this module costs nothing
+db = None
+mgi_utils = None
+loadlib = None
 
-user = os.environ['MGD_DBUSER']
-passwordFileName = os.environ['MGD_DBPASSWORDFILE']
-inputFileName = os.environ['STRAININPUTFILE']
+#globals
 
 TAB = '\t'		# tab
 CRT = '\n'		# carriage return/newline
 
-diagFile = ''		# diagnostic file descriptor
-errorFile = ''		# error file descriptor
-inputFile = ''		# file descriptor
-strainFile = ''         # file descriptor
-
 strainTable = 'PRB_Strain_Marker'
 
 strainFileName = strainTable + '.bcp'
 
-diagFileName = ''	# diagnostic file name
-errorFileName = ''	# error file name
-
-strainalleleKey = 0           # PRB_Strain._Strain_key
-
 strainTypeKey = 10	# ACC_MGIType._MGIType_key for Strains
 alleleTypeKey = 11	# ACC_MGIType._MGIType_key for Allele
 markerTypeKey = 2       # ACC_MGIType._MGIType_key for Marker
 
-qualifiersDict = {}    # dictionary of types for quick lookup
+numFields = 4		# number of fields in an input record
+
+def loadModules():
+        # requires:
+        #
+        # effects:
+        #       imports db, mgi_utils and loadlib on first use
+        #
+        # returns:
+        #       nothing
+        #
+
+    global db, mgi_utils, loadlib
+
+    if db is None:
+        db, mgi_utils, loadlib = strainloadlib.loadModules()
+
+class StrainAlleleLoader:
+    # Is: one load of Strain/Marker associations
+    # Has: a StrainLoadConfig, a connection, a LookupCache,
+    #	the output/log files and the primary key counter
+    # Does: init(), setPrimaryKeys(), loadDictionaries(), processFile(), close()
+    #	or all of them via run()
+    #
+    # If a connection is given, it must already be open
+    # (db.useOneConnection(1)); the loader will neither log in nor close it.
+    # If a cache is given, its lookups are used and extended by this load.
+
+    def __init__(self,
+        config,			# StrainLoadConfig
+        connection = None,	# open db connection (the db module)
+        cache = None,		# strainloadlib.LookupCache
+        ):
+
+        loadModules()
+
+        self.config = config
+        self.db = connection if connection is not None else db
+        self.ownConnection = connection is None
+        self.cache = cache if cache is not None else strainloadlib.LookupCache()
+
+        self.loaddate = loadlib.loaddate
 
-loaddate = loadlib.loaddate
+        self.diagFile = None		# diagnostic file descriptor
+        self.errorFile = None		# error file descriptor
+        self.inputFile = None		# file descriptor
+        self.strainFile = None		# file descriptor
 
-def exit(status, message = None):
-        # requires: status, the numeric exit status (integer)
-        #           message (string)
+        self.diagFileName = ''		# diagnostic file name
+        self.errorFileName = ''		# error file name
+
+        self.strainalleleKey = 0	# PRB_Strain_Marker._StrainMarker_key
+        self.startKey = None		# first PRB_Strain_Marker key of this load
+
+        self.lineNum = 0
+        self.errorCount = 0		# rejected lines
+        self.progress = None		# strainprogress.Progress
+        self.slowQueryLog = None	# strainslowquery.SlowQueryLog
+        self.sqlLog = None		# caller's SQL log settings (see strainloadlib.sqlLogSettings())
+        self.failed = False
+
+        self.qualifiersDict = {}	# dictionary of qualifiers for quick lookup
+
+    def openFile(self, fileName, mode):
+        # requires: fileName (string), mode (string)
         #
         # effects:
-        # Print message to stderr and exits
+        # opens the file; raises StrainLoadError if it cannot be opened
         #
         # returns:
+        # file descriptor
         #
 
-    if message is not None:
-        sys.stderr.write('\n' + str(message) + '\n')
- 
-    try:
-        diagFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
-        errorFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
-        diagFile.close()
-        errorFile.close()
-        inputFile.close()
-    except:
-        pass
-
-    db.useOneConnection(0)
-    sys.exit(status)
+        try:
+            return open(fileName, mode)
+        except:
+            raise strainloadlib.StrainLoadError('Could not open file %s\n' % fileName)
+
+    def run(self, records = None):
+        # requires: records, iterator of records; default is the input file
+        #
+        # effects:
+        # runs the whole load
+        #
+        # returns:
+        #
+
+        try:
+            self.init()
+            if self.config.profile:
+                import strainprofile
+                self.diagFile.write('Profile: %s.profile\n' % (self.profileBaseName()))
+                strainprofile.run(self.profileBaseName(), self.load, records)
+            else:
+                self.load(records)
+        except BaseException:
+            self.failed = True
+            raise
+        finally:
+            self.close()
+
+    def load(self, records = None):
+        # requires: init() has been called
+        #
+        # effects:
+        # loads the records (everything after init())
+        #
+        # returns:
+        #
+
+        if self.config.coordinate:
+            # the key lease is sized from the records
+            if records is None:
+                records = self.openRecords()
+            records = list(records)
+
+        self.setPrimaryKeys(records)
+        self.loadDictionaries()
+        self.processFile(records)
+
+    def profileBaseName(self):
+        # requires:
+        #
+        # effects:
+        #
+        # returns:
+        # the profile file name (without suffix), next to the diagnostics file
+        #
+
+        return os.path.splitext(self.diagFileName)[0]
+
+    def close(self):
+        # requires:
+        #
+        # effects:
+        # writes the end time, closes the files
+        # and the connection (if the loader opened it)
+        #
+        # returns:
+        #
+
+        if self.progress is not None:
+            self.progress.stop('failed' if self.failed else 'done')
+            self.progress = None
+
+        # lookups made by this load, for the lookup daemon
+        self.cache.flush()
+
+        if self.slowQueryLog is not None:
+            try:
+                self.slowQueryLog.uninstall()
+            except:
+                pass
+            self.slowQueryLog = None
+
+        try:
+            self.diagFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
+            self.errorFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
+            self.diagFile.close()
+            self.errorFile.close()
+        except:
+            pass
+
+        for f in (self.inputFile, self.strainFile):
+            try:
+                f.close()
+            except:
+                pass
+
+        if self.sqlLog is not None:
+            strainloadlib.restoreSqlLog(self.db, self.sqlLog)
+            self.sqlLog = None
+
+        if self.ownConnection:
+            self.db.useOneConnection(0)
  
-def init():
+    def init(self):
         # requires: 
         #
         # effects: 
-        # 1. Processes command line options
-        # 2. Initializes local DBMS parameters
-        # 3. Initializes global file descriptors/file names
-        # 4. Initializes global keys
+        # 1. Initializes local DBMS parameters
+        # 2. Initializes file descriptors/file names
         #
         # returns:
         #
 
-    global diagFile, errorFile, inputFile, errorFileName, diagFileName
-    global strainFile
- 
-    db.useOneConnection(1)
-    db.set_sqlUser(user)
-    db.set_sqlPasswordFromFile(passwordFileName)
+        config = self.config
+
+        if config.trace:
+            self.db.setTrace()
+
+        if self.ownConnection:
+            self.db.useOneConnection(1)
+            self.db.set_sqlUser(config.user)
+            self.db.set_sqlPasswordFromFile(config.passwordFileName)
  
-    fdate = mgi_utils.date('%m%d%Y')	# current date
-    head, tail = os.path.split(inputFileName) 
-    diagFileName = tail + '.' + fdate + '.diagnostics'
-    errorFileName = tail + '.' + fdate + '.error'
+        fdate = mgi_utils.date('%m%d%Y')	# current date
+        tail = config.logBaseName()
+        self.diagFileName = config.outputPath(tail + '.' + fdate + '.diagnostics')
+        self.errorFileName = config.outputPath(tail + '.' + fdate + '.error')
 
-    try:
-        diagFile = open(diagFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % diagFileName)
-                
-    try:
-        errorFile = open(errorFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % errorFileName)
-                
-    try:
-        inputFile = open(inputFileName, 'r')
-    except:
-        exit(1, 'Could not open file %s\n' % inputFileName)
+        self.diagFile = self.openFile(self.diagFileName, 'w')
+        self.errorFile = self.openFile(self.errorFileName, 'w')
+        try:
+            self.strainFile = strainbcp.SortedBCPFile(config.outputPath(strainFileName))
+        except:
+            raise strainloadlib.StrainLoadError('Could not open file %s\n' % strainFileName)
+
+        # Log all SQL (the caller's settings are restored by close())
+        if not self.ownConnection:
+            self.sqlLog = strainloadlib.sqlLogSettings(self.db)
+        self.db.set_sqlLogFunction(self.db.sqlLogAll)
+
+        # Set Log File Descriptor
+        self.db.set_sqlLogFD(self.diagFile)
+
+        if config.progressInterval > 0:
+            import strainprogress
+            self.progress = strainprogress.Progress(os.path.splitext(self.diagFileName)[0] + '.status',
+                self.snapshot, config.progressInterval)
+            self.progress.start()
+
+        if config.slowQuery > 0:
+            import strainslowquery
+            self.slowQueryLog = strainslowquery.SlowQueryLog(self.db,
+                os.path.splitext(self.diagFileName)[0] + '.slowqueries', config.slowQuery)
+            self.slowQueryLog.install()
+
+        # a warm cache is refreshed, so that it has the strains of loads
+        # that ran since it was attached
+        if config.lookupSocket or self.cache.client is not None:
+            try:
+                self.cache.attach(config.lookupSocket)
+                self.diagFile.write('Lookup daemon: %s\n' % (config.lookupSocket))
+            except (OSError, ValueError) as message:
+                self.diagFile.write('Lookup daemon %s not used: %s\n' % (config.lookupSocket, message))
+
+        self.diagFile.write('Start Date/Time: %s\n' % (mgi_utils.date()))
+        self.diagFile.write('Server: %s\n' % (self.db.get_sqlServer()))
+        self.diagFile.write('Database: %s\n' % (self.db.get_sqlDatabase()))
+
+        self.errorFile.write('Start Date/Time: %s\n\n' % (mgi_utils.date()))
+
+    def setPhase(self, phase):
+        # requires: phase (string)
+        #
+        # effects:
+        # sets the phase shown by the progress reporter
+        #
+        # returns:
+        #
 
-    try:
-        strainFile = open(strainFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % strainFileName)
+        if self.progress is not None:
+            self.progress.setPhase(phase)
 
-    # Log all SQL
-    db.set_sqlLogFunction(db.sqlLogAll)
+    def snapshot(self):
+        # requires:
+        #
+        # effects:
+        #
+        # returns:
+        # the counters shown by the progress reporter
+        # (see strainprogress.Progress)
+        #
 
-    # Set Log File Descriptor
-    db.set_sqlLogFD(diagFile)
+        rows = {}
+        if self.startKey is not None:
+            rows[strainTable] = self.strainalleleKey - self.startKey
 
-    diagFile.write('Start Date/Time: %s\n' % (mgi_utils.date()))
-    diagFile.write('Server: %s\n' % (db.get_sqlServer()))
-    diagFile.write('Database: %s\n' % (db.get_sqlDatabase()))
+        if self.inputFile is not None:
+            fraction = self.inputFile.fraction()
+        else:
+            fraction = None
 
-    errorFile.write('Start Date/Time: %s\n\n' % (mgi_utils.date()))
+        return {'lines' : self.lineNum, 'rejected' : self.errorCount, 'rows' : rows, 'fraction' : fraction}
 
-    return
+    def openRecords(self):
+        # requires:
+        #
+        # effects:
+        # opens the configured input file
+        #
+        # returns:
+        # iterator of records
+        #
+
+        self.inputFile = strainloadlib.RecordReader(self.config.inputFileName, numFields)
+        return iter(self.inputFile)
 
-def verifyQualifier(qualifier, lineNum):
+    def verifyQualifier(self, qualifier, lineNum):
         # requires:
         #       qualifier - the Qualifier
         #       lineNum - the line number of the record from the input file
@@ -187,152 +424,183 @@ def verifyQualifier(qualifier, lineNum):
 
         qualifierKey = 0
 
-        if qualifier in qualifiersDict:
-                qualifierKey = qualifiersDict[qualifier]
+        if qualifier in self.qualifiersDict:
+                qualifierKey = self.qualifiersDict[qualifier]
         else:
-                errorFile.write('Invalid Qualifier (%d) %s\n' % (lineNum, qualifier))
+                self.errorFile.write('Invalid Qualifier (%d) %s\n' % (lineNum, qualifier))
                 qualifierKey = 0
 
         return(qualifierKey)
 
-def loadDictionaries():
+    def loadDictionaries(self):
         # requires:
         #
         # effects:
-        #       loads global dictionaries for quicker lookup
+        #       loads dictionaries for quicker lookup
+        #       (no query if the cache is already warm)
         #
         # returns:
         #       nothing
 
-        global qualifiersDict
-
-        results = db.sql('select _Term_key, term from VOC_Term where _Vocab_key = 31', 'auto')
-        for r in results:
-                qualifiersDict[r['term']] = r['_Term_key']
+        self.setPhase('loadDictionaries')
+        self.qualifiersDict = self.cache.qualifiers(self.db)
 
-def setPrimaryKeys():
+    def setPrimaryKeys(self, records = None):
         # requires:
+        #       records - list of records (coordinated mode)
         #
         # effects:
-        #       Sets the global primary keys values needed for the load
+        #       Sets the primary key counter needed for the load
+        #       in coordinated mode, leases one key per record
+        #       (see strainkeys.py)
         #
         # returns:
         #       nothing
         #
 
-    global strainalleleKey
+        self.setPhase('setPrimaryKeys')
 
-    results = db.sql(''' select nextval('prb_strain_marker_seq') as maxKey ''', 'auto')
-    strainalleleKey = results[0]['maxKey']
+        if self.config.coordinate:
+            import strainkeys
+            leaser = strainkeys.KeyLeaser(self.db, self.diagFile, self.config.blockSize)
+            self.strainalleleKey = leaser.leaseSequence('prb_strain_marker_seq', max(len(records), 1))
+            self.startKey = self.strainalleleKey
+            return
 
-def processFile():
-        # requires:
+        results = self.db.sql(''' select nextval('prb_strain_marker_seq') as maxKey ''', 'auto')
+        self.strainalleleKey = results[0]['maxKey']
+        self.startKey = self.strainalleleKey
+
+    def processFile(self, records = None):
+        # requires: records, iterator of records; default is the input file
         #
         # effects:
-        #       Reads input file
-        #       Verifies and Processes each line in the input file
+        #       Verifies and Processes each record
         #
         # returns:
         #       nothing
         #
 
-    global strainalleleKey
+        db = self.db
+        cache = self.cache
+        errorFile = self.errorFile
 
-    lineNum = 0
-    notDeleted = 1
+        if records is None:
+            records = self.openRecords()
 
-    # For each line in the input file
+        lineNum = 0
+        notDeleted = 1
 
-    for line in inputFile.readlines():
+        self.setPhase('processFile')
 
-        error = 0
-        lineNum = lineNum + 1
+        # For each record
 
-        # Split the line into tokens
-        tokens = str.split(line[:-1], '\t')
+        for tokens in records:
 
-        try:
-            strainID = tokens[0]
-            alleleID = tokens[1]
-            qualifier = tokens[2]
-            createdBy = tokens[3]
-        except:
-            exit(1, 'Invalid Line (%d): %s\n' % (lineNum, line))
+            error = 0
+            lineNum = lineNum + 1
+            self.lineNum = lineNum
 
-        if len(strainID) == 4:
-            strainID = '00' + strainID
-        if len(strainID) == 3:
-            strainID = '000' + strainID
-        if len(strainID) == 2:
-            strainID = '0000' + strainID
-        if len(strainID) == 1:
-            strainID = '00000' + strainID
+            try:
+                strainID = tokens[0]
+                alleleID = tokens[1]
+                qualifier = tokens[2]
+                createdBy = tokens[3]
+            except:
+                raise strainloadlib.StrainLoadError('Invalid Line (%d): %s\n' % (lineNum, TAB.join(tokens)))
 
-        strainKey = loadlib.verifyObject(strainID, strainTypeKey, None, lineNum, errorFile)
+            if len(strainID) == 4:
+                strainID = '00' + strainID
+            if len(strainID) == 3:
+                strainID = '000' + strainID
+            if len(strainID) == 2:
+                strainID = '0000' + strainID
+            if len(strainID) == 1:
+                strainID = '00000' + strainID
 
-        # this could generate an error because the ID is a marker, not an allele
-        # just ignore the error in the error file if it gets resolved later
-        alleleKey = loadlib.verifyObject(alleleID, alleleTypeKey, None, lineNum, errorFile)
-        markerKey = 0
+            strainKey = cache.verifyObject(loadlib, strainID, strainTypeKey, lineNum, errorFile)
 
-        if alleleKey == 0:
-            markerKey = loadlib.verifyObject(alleleID, markerTypeKey, None, lineNum, errorFile)
+            # this could generate an error because the ID is a marker, not an allele
+            # just ignore the error in the error file if it gets resolved later
+            alleleKey = cache.verifyObject(loadlib, alleleID, alleleTypeKey, lineNum, errorFile)
+            markerKey = 0
 
-        qualifierKey = verifyQualifier(qualifier, lineNum)
-        createdByKey = loadlib.verifyUser(createdBy, lineNum, errorFile)
+            if alleleKey == 0:
+                markerKey = cache.verifyObject(loadlib, alleleID, markerTypeKey, lineNum, errorFile)
 
-        if notDeleted:
-            db.sql('delete PRB_Strain_Marker where _CreatedBy_key = %s' % (createdByKey), None)
-            notDeleted = 0
+            qualifierKey = self.verifyQualifier(qualifier, lineNum)
+            createdByKey = cache.verifyUser(loadlib, createdBy, lineNum, errorFile)
 
-        # if Allele found, resolve to Marker
+            if notDeleted:
+                db.sql('delete PRB_Strain_Marker where _CreatedBy_key = %s' % (createdByKey), None)
+                notDeleted = 0
 
-        if alleleKey > 0:
-            results = db.sql('select _Marker_key from ALL_Allele where _Allele_key = %s' % (alleleKey),  'auto')
-            if len(results) > 0:
-                markerKey = results[0]['_Marker_key']
+            # if Allele found, resolve to Marker
 
-        elif markerKey == 0:
-            errorFile.write('Invalid Allele (%s): %s\n' % (lineNum, alleleID))
-            error = 1
+            if alleleKey > 0:
+                alleleMarkerKey = cache.alleleMarker(db, alleleKey)
+                if alleleMarkerKey != 0:
+                    markerKey = alleleMarkerKey
 
-        if strainKey == 0 or markerKey == 0 or qualifierKey == 0:
-            # set error flag to true
-            error = 1
+            elif markerKey == 0:
+                errorFile.write('Invalid Allele (%s): %s\n' % (lineNum, alleleID))
+                error = 1
 
-        # if errors, continue to next record
-        if error:
-            continue
+            if strainKey == 0 or markerKey == 0 or qualifierKey == 0:
+                # set error flag to true
+                error = 1
 
-        # if no errors, process
+            # if errors, continue to next record
+            if error:
+                self.errorCount = self.errorCount + 1
+                continue
 
-        if alleleKey == 0:
-            alleleKey = ''
+            # if no errors, process
 
-        strainFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
-            % (strainalleleKey, strainKey, markerKey, alleleKey, qualifierKey, createdByKey, createdByKey, loaddate, loaddate))
+            if alleleKey == 0:
+                alleleKey = ''
 
-        strainalleleKey = strainalleleKey + 1
+            self.strainFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
+                % (self.strainalleleKey, strainKey, markerKey, alleleKey, qualifierKey, createdByKey, createdByKey, self.loaddate, self.loaddate))
 
-    #	end of "for line in inputFile.readlines():"
+            self.strainalleleKey = self.strainalleleKey + 1
 
-    #
-    # Update the AccessionMax value
-    #
+        #	end of "for tokens in records:"
 
-    db.sql('select * from ACC_setMax (%d);' % (lineNum), None)
-    db.commit()
+        # the bcp file is written out in primary key order
+        self.strainFile.close()
 
-    # update prb_strain_marker_seq auto-sequence
-    db.sql(''' select setval('prb_strain_marker_seq', (select max(_StrainMarker_key) from PRB_Strain_Marker)) ''', None)
-    db.commit()
+        #
+        # Update the AccessionMax value
+        #
+
+        self.setPhase('setMax')
+
+        db.sql('select * from ACC_setMax (%d);' % (lineNum), None)
+        db.commit()
+
+        # update prb_strain_marker_seq auto-sequence
+        # (coordinated loads advanced it when the keys were leased)
+        if not self.config.coordinate:
+            db.sql(''' select setval('prb_strain_marker_seq', (select max(_StrainMarker_key) from PRB_Strain_Marker)) ''', None)
+            db.commit()
 
 #
 # Main
 #
 
-init()
-setPrimaryKeys()
-loadDictionaries()
-processFile()
-exit(0)
+if __name__ == '__main__':
+
+    try:
+        options = strainloadlib.parseOptions(sys.argv[1:])
+        if options['diff'] or options['chunkSizes'] or options['indexThreshold'] or options['analyze']:
+            raise strainloadlib.StrainLoadError('--diff, --chunksize, --indexthreshold and --analyze are not supported by strainalleleload.py\n')
+        config = strainloadlib.StrainLoadConfig.fromEnvironment(profile = options['profile'],
+            progressInterval = options['progressInterval'], coordinate = options['coordinate'],
+            slowQuery = options['slowQuery'], lookupSocket = options['lookupSocket'])
+        StrainAlleleLoader(config).run()
+    except strainloadlib.StrainLoadError as message:
+        sys.stderr.write('\n' + str(message) + '\n')
+        sys.exit(1)
+
+    sys.exit(0)
@@ -0,0 +1,139 @@
+
+#
+# Program: strainanalyze.py
+#
+# Purpose:
+#
+#	Post-load statistics refresh (the --analyze option of strainload.py).
+#
+#	After the bcp files are loaded, a table is analyzed if this load
+#	changed at least analyzeFraction (--analyzefraction, default 0.05)
+#	of its estimated rows (pg_class.reltuples), so that allstrain.csh
+#	and other cache loads that run next get plans for the table as it
+#	is now rather than as autovacuum last saw it.
+#
+#	The tables are analyzed concurrently, one psql per table, and the
+#	decision and timing of each are written to the diagnostics file.
+#
+# History
+#
+
+import os
+import time
+import subprocess
+import threading
+
+schema = 'mgd'
+
+defaultFraction = 0.05	# analyze tables that grew/changed by at least this fraction
+
+# Purpose: returns the estimated row counts of tables
+# Returns: dictionary (table -> reltuples)
+# Assumes: db connection is open
+# Effects: queries the catalog
+# Throws: nothing
+
+def estimatedRows(db, tables):
+
+    results = db.sql('''
+        select c.relname, c.reltuples
+        from pg_class c, pg_namespace n
+        where c.relnamespace = n.oid
+        and n.nspname = '%s'
+        and c.relname in (%s)
+        ''' % (schema, ','.join(["lower('%s')" % (t) for t in tables])), 'auto')
+
+    estimates = {}
+    for r in results:
+        estimates[r['relname']] = max(r['reltuples'], 0)
+
+    return dict([(t, estimates.get(t.lower(), 0)) for t in tables])
+
+# Purpose: chooses the tables to analyze
+# Returns: list of tables
+# Assumes: nothing
+# Effects: writes the decision for each table to the diagnostics file
+# Throws: nothing
+
+def chooseTables(
+    db,			# open db connection
+    diagFile,		# diagnostics file descriptor
+    rowCounts,		# table -> rows changed by this load
+    fraction = defaultFraction,
+    ):
+
+    tables = [t for t in rowCounts if rowCounts[t] > 0]
+    if len(tables) == 0:
+        return []
+
+    estimates = estimatedRows(db, tables)
+    chosen = []
+
+    for t in tables:
+        # reltuples already includes the rows of this load if autovacuum
+        # got there first; either way, a small ratio means little changed
+        ratio = rowCounts[t] / max(estimates[t], 1)
+        analyze = ratio >= fraction
+        diagFile.write('Analyze %s: %s (rows changed %d, estimated rows %d, ratio %.4f)\n' \
+            % (t, 'yes' if analyze else 'no', rowCounts[t], estimates[t], ratio))
+        if analyze:
+            chosen.append(t)
+
+    return chosen
+
+# Purpose: analyzes tables concurrently
+# Returns: nothing
+# Assumes: psql is on the PATH
+# Effects: runs "analyze" on each table in its own psql session;
+#	writes the timing of each to the diagnostics file
+# Throws: nothing
+
+def analyzeTables(
+    server,		# database server (string)
+    database,		# database name (string)
+    user,		# database user (string)
+    passwordFileName,	# database password file (string)
+    diagFile,		# diagnostics file descriptor
+    tables,		# list of tables
+    ):
+
+    if len(tables) == 0:
+        return
+
+    env = dict(os.environ)
+    if passwordFileName:
+        try:
+            with open(passwordFileName, 'r') as passwordFile:
+                env['PGPASSWORD'] = passwordFile.readline().strip()
+        except OSError as message:
+            # the load itself is committed; only the statistics are stale
+            for table in tables:
+                diagFile.write('Analyze %s.%s: FAILED (%s)\n' % (schema, table, message))
+            return
+
+    timings = {}
+
+    def analyze(table):
+        startTime = time.time()
+        try:
+            status = subprocess.call(['psql', '-q', '-X', '-h', server, '-U', user, '-d', database,
+                '-c', 'analyze %s.%s' % (schema, table)], env = env)
+        except OSError:
+            status = -1
+        timings[table] = (status, time.time() - startTime)
+
+    startTime = time.time()
+    threads = [threading.Thread(target = analyze, args = (t,)) for t in tables]
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for table in tables:
+        status, elapsed = timings[table]
+        diagFile.write('Analyze %s.%s: %.2f sec%s\n' \
+            % (schema, table, elapsed, '' if status == 0 else ' (FAILED, status %d)' % (status)))
+
+    diagFile.write('Analyze total: %.2f sec\n' % (time.time() - startTime))
+
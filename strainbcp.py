@@ -0,0 +1,340 @@
+
+#
+# Program: strainbcp.py
+#
+# Purpose:
+#
+#	Loads the bcp files of a strain load through bcpin.csh:
+#
+#	- in chunks of at most chunkSize rows per bcpin.csh call, so
+#	  that each chunk is committed on its own (--chunksize)
+#
+#	- for tables receiving at least indexThreshold rows, with the
+#	  table's non-unique, non-primary-key indexes dropped before the
+#	  load and re-created afterwards (--indexthreshold); the index
+#	  definitions are written to the diagnostics file first, so they
+#	  can be re-created by hand if the load dies in between
+#
+#	With neither option, each table is loaded by one bcpin.csh call,
+#	as before.
+#
+#	SortedBCPFile writes a bcp file in primary key order, whatever
+#	order its rows arrive in, so that bcpin appends to the primary
+#	key index in order.  Rows that arrive in order (a serial load)
+#	are streamed straight to the file; otherwise they are sorted in
+#	memory, spilled to sorted run files every maxBufferRows rows,
+#	and merged when the file is closed.
+#
+# History
+#
+
+import os
+import heapq
+import tempfile
+import strainloadlib
+
+schema = 'mgd'
+
+maxBufferRows = 500000	# rows held in memory per bcp file before a run is spilled
+
+# Purpose: counts the rows of a bcp file
+# Returns: number of rows (integer)
+# Assumes: the file has been flushed
+# Effects: reads the file
+# Throws: nothing
+
+def countRows(fileName):
+
+    rows = 0
+
+    with open(fileName, 'rb') as f:
+        for line in f:
+            rows = rows + 1
+
+    return rows
+
+# Purpose: returns the droppable indexes of a table
+# Returns: list of (index name, index definition)
+# Assumes: db connection is open
+# Effects: queries the catalog
+# Throws: nothing
+
+def droppableIndexes(db, table):
+
+    results = db.sql('''
+        select i.indexname, i.indexdef
+        from pg_indexes i, pg_class c, pg_namespace n, pg_index x
+        where i.schemaname = '%s'
+        and i.tablename = lower('%s')
+        and c.relname = i.indexname
+        and c.relnamespace = n.oid
+        and n.nspname = i.schemaname
+        and x.indexrelid = c.oid
+        and not x.indisprimary
+        and not x.indisunique
+        order by i.indexname
+        ''' % (schema, table), 'auto')
+
+    return [(r['indexname'], r['indexdef']) for r in results]
+
+class BCPLoader:
+    # Is: the bcp stage of one strain load
+    # Has: the connection, the diagnostics file, the output directory,
+    #	chunk sizes and the index threshold
+    # Does: bcpTable() loads one table, in chunks and/or without
+    #	its secondary indexes
+
+    def __init__(self,
+        db,			# open db connection
+        diagFile,		# diagnostics file descriptor
+        directory,		# directory of the bcp files (string)
+        chunkSizes = None,	# table (or '' for all) -> rows per chunk; 0 = one chunk
+        indexThreshold = 0,	# drop indexes for loads of at least this many rows; 0 = never
+        ):
+
+        self.db = db
+        self.diagFile = diagFile
+        self.directory = directory
+        self.chunkSizes = chunkSizes or {}
+        self.indexThreshold = indexThreshold
+        self.bcpCommand = os.environ['PG_DBUTILS'] + '/bin/bcpin.csh'
+
+    # Purpose: returns the chunk size of a table
+    # Returns: integer (0 = whole file)
+
+    def chunkSize(self, table):
+
+        return self.chunkSizes.get(table, self.chunkSizes.get('', 0))
+
+    # Purpose: runs bcpin.csh for one file
+    # Returns: exit status of bcpin.csh
+    # Assumes: nothing
+    # Effects: loads the file into the table
+    # Throws: nothing
+
+    def bcpin(self, table, fileName):
+
+        bcp = '%s %s %s %s %s %s "|" "\\n" %s' % \
+            (self.bcpCommand, self.db.get_sqlServer(), self.db.get_sqlDatabase(),
+             table, self.directory, fileName, schema)
+        self.diagFile.write('%s\n' % bcp)
+        self.diagFile.flush()
+
+        return os.system(bcp)
+
+    # Purpose: loads one bcp file into its table
+    # Returns: number of rows loaded (integer)
+    # Assumes: the file has been flushed; the transaction that wrote
+    #	the file's keys has been committed
+    # Effects: loads the table; may drop and re-create its indexes
+    # Throws: StrainLoadError if bcpin.csh fails (earlier chunks stay loaded)
+
+    def bcpTable(self, table, fileName):
+
+        rows = countRows(os.path.join(self.directory, fileName))
+        chunkSize = self.chunkSize(table)
+
+        indexes = []
+        if self.indexThreshold > 0 and rows >= self.indexThreshold:
+            indexes = self.dropIndexes(table)
+
+        try:
+            if chunkSize <= 0 or rows <= chunkSize:
+                if self.bcpin(table, fileName) != 0:
+                    raise strainloadlib.StrainLoadError('bcpin.csh failed: %s (%s)\n' \
+                        % (table, os.path.join(self.directory, fileName)))
+            else:
+                self.bcpChunks(table, fileName, chunkSize)
+        finally:
+            self.createIndexes(indexes)
+
+        return rows
+
+    # Purpose: loads a bcp file chunkSize rows at a time
+    # Returns: nothing
+    # Assumes: nothing
+    # Effects: writes/removes <fileName>.<n> chunk files, loads the table
+    # Throws: StrainLoadError if a chunk fails
+
+    def bcpChunks(self, table, fileName, chunkSize):
+
+        chunkNum = 0
+
+        # rows end in '\n' only; a '\r' inside a note is data
+        with open(os.path.join(self.directory, fileName), 'r', newline = '\n') as bcpFile:
+
+            while True:
+
+                chunk = []
+                for line in bcpFile:
+                    chunk.append(line)
+                    if len(chunk) == chunkSize:
+                        break
+
+                if len(chunk) == 0:
+                    break
+
+                chunkNum = chunkNum + 1
+                chunkFileName = '%s.%d' % (fileName, chunkNum)
+                chunkPath = os.path.join(self.directory, chunkFileName)
+
+                with open(chunkPath, 'w', newline = '\n') as chunkFile:
+                    chunkFile.writelines(chunk)
+
+                if self.bcpin(table, chunkFileName) != 0:
+                    raise strainloadlib.StrainLoadError('bcpin.csh failed: %s chunk %d (%s)\n' \
+                        % (table, chunkNum, chunkPath))
+
+                os.remove(chunkPath)
+
+    # Purpose: drops the droppable indexes of a table
+    # Returns: list of (index name, index definition)
+    # Assumes: nothing
+    # Effects: drops indexes; writes their definitions to the diagnostics file
+    # Throws: nothing
+
+    def dropIndexes(self, table):
+
+        indexes = droppableIndexes(self.db, table)
+
+        for indexName, indexDef in indexes:
+            self.diagFile.write('Dropping index (re-create with): %s;\n' % (indexDef))
+            self.db.sql('drop index %s.%s' % (schema, indexName), None)
+
+        self.db.commit()
+        return indexes
+
+    # Purpose: re-creates dropped indexes
+    # Returns: nothing
+    # Assumes: nothing
+    # Effects: creates indexes
+    # Throws: nothing
+
+    def createIndexes(self, indexes):
+
+        for indexName, indexDef in indexes:
+            self.diagFile.write('Re-creating index %s\n' % (indexName))
+            self.db.sql(indexDef, None)
+            self.db.commit()
+
+class SortedBCPFile:
+    # Is: a bcp file written in primary key order
+    # Has: the file name, the number of leading key columns,
+    #	the in-memory buffer and the spilled run files
+    # Does: write() takes '|'-delimited rows in any order;
+    #	close() leaves the file sorted by its key columns
+    #
+    # The key is the first keyFields columns, compared as integers
+    # (ex. _Note_key, sequenceNum for MGI_NoteChunk).
+
+    def __init__(self,
+        fileName,		# bcp file (string)
+        keyFields = 1,		# number of leading key columns (integer)
+        maxRows = None,		# rows buffered before a run is spilled (integer)
+        ):
+
+        self.fileName = fileName
+        self.keyFields = keyFields
+        self.maxRows = maxRows or maxBufferRows
+        self.file = open(fileName, 'w')
+        self.lastKey = None
+        self.streaming = True	# rows so far arrived in order
+        self.buffer = []
+        self.runs = []		# sorted run file names
+        self.closed = False
+
+    # Purpose: returns the key of a row
+    # Returns: tuple of integers
+
+    def key(self, line):
+
+        return tuple([int(k) for k in line.split('|', self.keyFields)[:self.keyFields]])
+
+    # Purpose: writes a row
+    # Returns: nothing
+    # Assumes: line is one '|'-delimited row ending in a newline
+    # Effects: writes to the file, or buffers the row
+    # Throws: nothing
+
+    def write(self, line):
+
+        if self.streaming:
+            key = self.key(line)
+            if self.lastKey is None or key > self.lastKey:
+                self.file.write(line)
+                self.lastKey = key
+                return
+
+            # out of order: what was written so far is the first run
+            self.file.close()
+            self.runs.append(self.newRunFileName())
+            os.replace(self.fileName, self.runs[-1])
+            self.file = None
+            self.streaming = False
+
+        self.buffer.append(line)
+        if len(self.buffer) >= self.maxRows:
+            self.spill()
+
+    def flush(self):
+
+        if self.file is not None:
+            self.file.flush()
+
+    # Purpose: returns the name of a new run file, next to the bcp file
+    # Returns: string
+
+    def newRunFileName(self):
+
+        head, tail = os.path.split(self.fileName)
+        fd, runFileName = tempfile.mkstemp(prefix = tail + '.', suffix = '.run', dir = head or '.')
+        os.close(fd)
+        return runFileName
+
+    # Purpose: writes the buffer as a sorted run file
+    # Returns: nothing
+    # Effects: empties the buffer
+
+    def spill(self):
+
+        self.buffer.sort(key = self.key)
+        runFileName = self.newRunFileName()
+
+        with open(runFileName, 'w') as runFile:
+            runFile.writelines(self.buffer)
+
+        self.runs.append(runFileName)
+        self.buffer = []
+
+    # Purpose: finishes the file
+    # Returns: nothing
+    # Assumes: nothing
+    # Effects: merges the run files and the buffer into the bcp file,
+    #	removes the run files
+    # Throws: nothing
+
+    def close(self):
+
+        if self.closed:
+            return
+
+        self.closed = True
+
+        if self.streaming:
+            self.file.close()
+            return
+
+        self.buffer.sort(key = self.key)
+        runFiles = [open(r, 'r', newline = '\n') for r in self.runs]
+
+        try:
+            with open(self.fileName, 'w') as bcpFile:
+                bcpFile.writelines(heapq.merge(*(runFiles + [self.buffer]), key = self.key))
+        finally:
+            for f in runFiles:
+                f.close()
+            for r in self.runs:
+                os.remove(r)
+
+        self.buffer = []
+        self.runs = []
@@ -0,0 +1,182 @@
+
+#
+# Program: strainkeys.py
+#
+# Purpose:
+#
+#	Leases primary key ranges so that several strainload.py and
+#	strainalleleload.py instances, on one host or many, may load
+#	into the same database at once (--coordinate).
+#
+#	Each loader asks for an upper bound of the keys it may use
+#	(ex. 2 ACC_Accession rows per input record) and gets a range
+#	that no other coordinated loader will use:
+#
+#	- sequences (prb_strain_seq, prb_strain_marker_seq, voc_annot_seq):
+#	  the range is taken by count nextval() calls in one statement,
+#	  while holding a transaction advisory lock on the sequence; if
+#	  another session's nextval() took a value in between (ex. an
+#	  editor), the range is not contiguous and is taken again, the
+#	  values already taken being left as gaps
+#
+#	- max(key) + 1 tables (ACC_Accession, MGI_Note): the key space is
+#	  cut into blocks of blockSize keys; a loader holds a session
+#	  advisory lock on every block of its range (pg_try_advisory_lock)
+#	  until its bcp files are loaded and committed, and skips blocks
+#	  that another loader holds; max(key) is read again once the
+#	  blocks are held, so that rows committed by a loader that has
+#	  just released them are not reused
+#
+#	- the MGI ID counter (ACC_AccessionMax): advanced past the whole
+#	  range by one update, under the counter's row lock
+#
+#	Unused keys of a range are left as gaps.  Because the sequences
+#	are advanced up front, coordinated loaders do not set them back
+#	to max(key) after the load.
+#
+#	Programs that do not use this module (ex. the editors) are not
+#	coordinated by it: their nextval() never returns a key of a
+#	leased sequence range, and they see the leased MGI ID range as
+#	used, but they may still take max(key) + 1 from a table.
+#
+# History
+#
+
+defaultBlockSize = 100000	# keys per leased block of a max(key) + 1 table
+
+# Purpose: returns the advisory lock class of a key space
+# Returns: SQL expression (string)
+
+def lockClass(name):
+
+    return "hashtext('strainload:%s')" % (name)
+
+class KeyLeaser:
+    # Is: the key leases of one load
+    # Has: the connection, the diagnostics file, the block size,
+    #	the block locks held
+    # Does: leaseSequence(), leaseMaxKey(), leaseMGIIDs(), release()
+
+    def __init__(self,
+        db,				# open db connection
+        diagFile,			# diagnostics file descriptor
+        blockSize = defaultBlockSize,	# keys per block (integer)
+        ):
+
+        self.db = db
+        self.diagFile = diagFile
+        self.blockSize = blockSize
+        self.locks = []		# (lock class, block number) held
+
+    # Purpose: leases count keys of a sequence
+    # Returns: first key of the range (integer)
+    # Assumes: count > 0
+    # Effects: advances the sequence by at least count; commits
+    # Throws: nothing
+
+    def leaseSequence(self, sequence, count):
+
+        db = self.db
+
+        db.sql('select pg_advisory_xact_lock(%s, 0)' % (lockClass(sequence)), 'auto')
+
+        while True:
+            results = db.sql('''
+                select min(k) as firstKey, max(k) as lastKey
+                from (select nextval('%s') as k from generate_series(1, %d)) s
+                ''' % (sequence, count), 'auto')
+
+            firstKey = results[0]['firstKey']
+            if results[0]['lastKey'] - firstKey + 1 == count:
+                break
+
+            self.diagFile.write('Leased %s: %d - %d not contiguous; leasing again\n' \
+                % (sequence, firstKey, results[0]['lastKey']))
+
+        db.commit()
+
+        self.diagFile.write('Leased %s: %d - %d\n' % (sequence, firstKey, firstKey + count - 1))
+        return firstKey
+
+    # Purpose: leases count keys of a max(key) + 1 table
+    # Returns: first key of the range (integer)
+    # Assumes: count > 0
+    # Effects: takes session advisory locks on the blocks of the range
+    #	(released by release())
+    # Throws: nothing
+
+    def leaseMaxKey(self, table, keyColumn, count):
+
+        db = self.db
+        blockSize = self.blockSize
+
+        maxKeySQL = 'select coalesce(max(%s), 0) + 1 as maxKey from %s' % (keyColumn, table)
+        firstKey = db.sql(maxKeySQL, 'auto')[0]['maxKey']
+
+        while True:
+
+            lastKey = firstKey + count - 1
+            locked = []
+            free = True
+
+            for block in range(firstKey // blockSize, lastKey // blockSize + 1):
+                results = db.sql('select pg_try_advisory_lock(%s, %d) as locked' \
+                    % (lockClass(table), block), 'auto')
+                if not results[0]['locked']:
+                    free = False
+                    break
+                locked.append(block)
+
+            if free:
+                # a loader may have loaded and released these blocks
+                # since max(key) was read
+                maxKey = db.sql(maxKeySQL, 'auto')[0]['maxKey']
+                if maxKey <= firstKey:
+                    break
+                nextKey = maxKey
+            else:
+                # another loader holds this block; start after it
+                nextKey = (block + 1) * blockSize
+
+            for b in locked:
+                db.sql('select pg_advisory_unlock(%s, %d)' % (lockClass(table), b), 'auto')
+            firstKey = max(firstKey, nextKey)
+
+        self.locks = self.locks + [(table, b) for b in locked]
+        self.diagFile.write('Leased %s: %d - %d\n' % (table, firstKey, lastKey))
+        return firstKey
+
+    # Purpose: leases count MGI IDs
+    # Returns: first numeric part of the range (integer)
+    # Assumes: count > 0
+    # Effects: advances ACC_AccessionMax by count; commits
+    # Throws: nothing
+
+    def leaseMGIIDs(self, prefix, count):
+
+        db = self.db
+
+        results = db.sql('''
+            update ACC_AccessionMax set maxNumericPart = maxNumericPart + %d
+            where prefixPart = '%s'
+            returning maxNumericPart - %d + 1 as firstKey
+            ''' % (count, prefix, count), 'auto')
+        db.commit()
+
+        firstKey = results[0]['firstKey']
+        self.diagFile.write('Leased %s IDs: %d - %d\n' % (prefix, firstKey, firstKey + count - 1))
+        return firstKey
+
+    # Purpose: releases the block locks
+    # Returns: nothing
+    # Assumes: the load's rows have been committed
+    # Effects: releases session advisory locks
+    # Throws: nothing
+
+    def release(self):
+
+        for table, block in self.locks:
+            self.db.sql('select pg_advisory_unlock(%s, %d)' % (lockClass(table), block), 'auto')
+
+        self.locks = []
+
@@ -17,10 +17,55 @@
 # Requirements Satisfied by This Program:
 #
 # Usage:
-#	strainload.py
+#	strainload.py [--profile] [--progress=SECONDS] [--diff]
+#		[--chunksize=[TABLE:]N] [--indexthreshold=N]
+#		[--coordinate] [--blocksize=N]
+#		[--analyze] [--analyzefraction=F] [--slowquery=MS]
+#		[--lookupd=SOCKET]
+#
+#	--profile: run under cProfile; writes <input>.<date>.profile
+#	and a summary <input>.<date>.profile.txt next to the diagnostics file
+#
+#	--diff: update strains that already exist (strain type, species,
+#	standard, private, alleles, attributes, notes) instead of
+#	rejecting them; unchanged strains are left alone
+#
+#	--progress=SECONDS: status file update interval (default 10, 0 = off);
+#	the status file is <input>.<date>.status, also written on SIGUSR1
+#
+#	--chunksize=[TABLE:]N: bcp N rows per transaction
+#	--indexthreshold=N: drop/re-create secondary indexes of tables
+#	receiving at least N rows (see strainbcp.py); not with --coordinate
+#
+#	--coordinate: lease key ranges under advisory locks, so that
+#	several coordinated loaders may run at once (see strainkeys.py);
+#	--blocksize=N: keys per leased ACC_Accession/MGI_Note block
+#
+#	--analyze: after the bcp, analyze the tables that this load
+#	changed by at least --analyzefraction (default 0.05) of their
+#	estimated rows, concurrently (see strainanalyze.py)
+#
+#	--slowquery=MS: write statements taking at least MS milliseconds,
+#	with their templates, parameters and plans, to
+#	<input>.<date>.slowqueries (see strainslowquery.py)
+#
+#	--lookupd=SOCKET: take the lookups from the lookup daemon
+#	listening on SOCKET, send it the lookups this load makes and
+#	the key ranges it inserted (see strainlookupd.py); without a
+#	daemon, the load goes on alone
+#
+#	or, from another load (see StrainLoader):
+#
+#	import strainload, strainloadlib
+#	config = strainloadlib.StrainLoadConfig(user, passwordFileName, inputFileName)
+#	strainload.StrainLoader(config, connection = db, cache = cache).run(records)
 #
 # Envvars:
 #
+#	MGD_DBUSER
+#	MGD_DBPASSWORDFILE
+#	STRAININPUTFILE
+#
 # Inputs:
 #
 #	A tab-delimited file in the format:
@@ -39,6 +84,10 @@
 #		field 13: Private (1/0)
 #	        field 14: IMPC Colony Note
 #
+#	The file may be gzip (.gz), bzip2 (.bz2) or xz (.xz) compressed,
+#	or a Parquet (.parquet) or Arrow (.arrow, .feather) file with
+#	the same fields as its first columns (see strainloadlib.RecordReader).
+#
 # Outputs:
 #
 #       4 BCP files:
@@ -56,10 +105,26 @@
 #
 # Assumes:
 #
-#	That no one else is adding records to the database.
+#	That no one else is adding records to the database,
+#	unless all loaders run with --coordinate (see strainkeys.py).
 #
 # History
 #
+# agent	10/19/2026
+#	- StrainLoader class; importable with an existing connection,
+#	  a warm LookupCache and an iterator of records
+#	- --profile option
+#	- compressed, Parquet/Arrow and mmap input (RecordReader)
+#	- --diff option; IMPC Colony Note chunk was written with the
+#	  Strain of Origin Note
+#	- --chunksize, --indexthreshold options
+#	- --progress option; status file
+#	- bcp files are written in primary key order (strainbcp.SortedBCPFile)
+#	- --coordinate, --blocksize options
+#	- --analyze, --analyzefraction options
+#	- --slowquery option
+#	- --lookupd option
+#
 # lec	04/09/2014
 #	- TR11623/EMMA strains
 #
@@ -69,32 +134,20 @@
 
 import sys
 import os
-import db
-import mgi_utils
-import loadlib
-
-#globals
+import strainloadlib
+import strainbcp
 
-db.setTrace()
+# db, mgi_utils and loadlib are imported by StrainLoader (see loadModules())
+# so that importing this module costs nothing
+db = None
+mgi_utils = None
+loadlib = None
 
-user = os.environ['MGD_DBUSER']
-passwordFileName = os.environ['MGD_DBPASSWORDFILE']
-inputFileName = os.environ['STRAININPUTFILE']
-lineNum = 0
+#globals
 
 TAB = '\t'		# tab
 CRT = '\n'		# carriage return/newline
 
-diagFile = ''		# diagnostic file descriptor
-errorFile = ''		# error file descriptor
-inputFile = ''		# file descriptor
-strainFile = ''         # file descriptor
-markerFile = ''         # file descriptor
-accFile = ''            # file descriptor
-annotFile = ''          # file descriptor
-noteFile = ''           # file descriptor
-noteChunkFile = ''      # file descriptor
-
 strainTable = 'PRB_Strain'
 markerTable = 'PRB_Strain_Marker'
 accTable = 'ACC_Accession'
@@ -109,16 +162,6 @@ annotFileName = annotTable + '.bcp'
 noteFileName = noteTable + '.bcp'
 noteChunkFileName = noteChunkTable + '.bcp'
 
-diagFileName = ''	# diagnostic file name
-errorFileName = ''	# error file name
-
-strainKey = 0           # PRB_Strain._Strain_key
-strainmarkerKey = 0	# PRB_Strain_Marker._StrainMarker_key
-accKey = 0              # ACC_Accession._Accession_key
-mgiKey = 0              # ACC_AccessionMax.maxNumericPart
-annotKey = 0
-noteKey = 0             # MGI_Note._Note_key
-
 isGeneticBackground = 0
 
 mgiTypeKey = 10		# ACC_MGIType._MGIType_key for Strains
@@ -132,479 +175,1057 @@ mgiIMPCColonyTypeKey = 1012	# MGI_Note._NoteType_key
 
 qualifierKey = 615427	# nomenclature
 
-strainDict = {}      	# dictionary of types for quick lookup
-strainTypesDict = {}    # dictionary of types for quick lookup
-speciesDict = {}      	# dictionary of species for quick lookup
+annotTypeKey = 1009		# VOC_Annot._AnnotType_key for Strain Attributes
+annotQualifierKey = 1614158	# VOC_Annot._Qualifier_key; this is a null qualifier key
 
-cdate = mgi_utils.date('%m/%d/%Y')	# current date
- 
-# Purpose: prints error message and exits
-# Returns: nothing
-# Assumes: nothing
-# Effects: exits with exit status
-# Throws: nothing
+# MGI_Note._NoteType_key, in the order the notes are written
+noteTypeKeys = (mgiStrainOriginTypeKey, mgiMutantOriginTypeKey, mgiIMPCColonyTypeKey)
 
-def exit(
-    status,          # numeric exit status (integer)
-    message = None   # exit message (string)
-    ):
+numFields = 14		# number of fields in an input record
 
-    if message is not None:
-        sys.stderr.write('\n' + str(message) + '\n')
- 
-    try:
-        diagFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
-        errorFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
-        diagFile.close()
-        errorFile.close()
-        inputFile.close()
-    except:
-        pass
-
-    db.useOneConnection(0)
-    sys.exit(status)
- 
-# Purpose: process command line options
+
+# Purpose: imports db, mgi_utils and loadlib on first use
 # Returns: nothing
 # Assumes: nothing
-# Effects: initializes global variables
-#          calls showUsage() if usage error
-#          exits if files cannot be opened
-# Throws: nothing
-
-def init():
-    global diagFile, errorFile, inputFile, errorFileName, diagFileName
-    global strainFile, markerFile, accFile, annotFile
-    global noteFile, noteChunkFile
- 
-    db.useOneConnection(1)
-    db.set_sqlUser(user)
-    db.set_sqlPasswordFromFile(passwordFileName)
- 
-    fdate = mgi_utils.date('%m%d%Y')	# current date
-    head, tail = os.path.split(inputFileName) 
-    diagFileName = tail + '.' + fdate + '.diagnostics'
-    errorFileName = tail + '.' + fdate + '.error'
+# Effects: sets the db, mgi_utils, loadlib globals
+# Throws: ImportError
 
-    try:
-        diagFile = open(diagFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % diagFileName)
-                
-    try:
-        errorFile = open(errorFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % errorFileName)
-                
-    try:
-        inputFile = open(inputFileName, 'r')
-    except:
-        exit(1, 'Could not open file %s\n' % inputFileName)
+def loadModules():
+    global db, mgi_utils, loadlib
 
-    try:
-        strainFile = open(strainFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % strainFileName)
+    if db is None:
+        db, mgi_utils, loadlib = strainloadlib.loadModules()
 
-    try:
-        markerFile = open(markerFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % markerFileName)
+# Purpose: quotes a string for SQL
+# Returns: string
 
-    try:
-        accFile = open(accFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % accFileName)
+def sqlString(s):
 
-    try:
-        noteFile = open(noteFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % noteFileName)
-
-    try:
-        noteChunkFile = open(noteChunkFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % noteChunkFileName)
+    return "'" + s.replace("'", "''") + "'"
 
-    try:
-        annotFile = open(annotFileName, 'w')
-    except:
-        exit(1, 'Could not open file %s\n' % annotFileName)
+class ExistingStrain:
+    # Is: the current database state of a strain (diff mode)
+    # Has: PRB_Strain attributes, nomenclature allele keys,
+    #	attribute term keys and notes (note type key -> text)
 
-    # Log all SQL
-    db.set_sqlLogFunction(db.sqlLogAll)
+    def __init__(self, r):
 
-    diagFile.write('Start Date/Time: %s\n' % (mgi_utils.date()))
-    diagFile.write('Server: %s\n' % (db.get_sqlServer()))
-    diagFile.write('Database: %s\n' % (db.get_sqlDatabase()))
+        self.strainKey = r['_Strain_key']
+        self.name = r['strain']
+        self.speciesKey = r['_Species_key']
+        self.strainTypeKey = r['_StrainType_key']
+        self.standard = r['standard']
+        self.private = r['private']
+        self.alleleKeys = []
+        self.annotTermKeys = []
+        self.notes = {}
 
-    errorFile.write('Start Date/Time: %s\n\n' % (mgi_utils.date()))
+class StrainLoader:
+    # Is: one load of new Strains
+    # Has: a StrainLoadConfig, a connection, a LookupCache,
+    #	the output/log files and the primary key counters
+    # Does: init(), setPrimaryKeys(), processFile(), bcpFiles(), close()
+    #	or all of them via run()
+    #
+    # If a connection is given, it must already be open
+    # (db.useOneConnection(1)); the loader will neither log in nor close it.
+    # If a cache is given, its lookups are used and extended by this load.
+    #
+    # In diff mode (config.diff), a record whose strain already exists
+    # is compared with the database and only its changed rows are
+    # replaced, instead of being rejected as "Strain Already Exists".
+
+    def __init__(self,
+        config,			# StrainLoadConfig
+        connection = None,	# open db connection (the db module)
+        cache = None,		# strainloadlib.LookupCache
+        ):
+
+        loadModules()
+
+        self.config = config
+        self.db = connection if connection is not None else db
+        self.ownConnection = connection is None
+        self.cache = cache if cache is not None else strainloadlib.LookupCache()
+
+        self.lineNum = 0
+        self.errorCount = 0		# rejected lines
+        self.recordCount = None		# number of records, if known
+        self.cdate = mgi_utils.date('%m/%d/%Y')	# current date
+
+        self.diagFile = None		# diagnostic file descriptor
+        self.errorFile = None		# error file descriptor
+        self.inputFile = None		# file descriptor
+        self.strainFile = None		# file descriptor
+        self.markerFile = None		# file descriptor
+        self.accFile = None		# file descriptor
+        self.annotFile = None		# file descriptor
+        self.noteFile = None		# file descriptor
+        self.noteChunkFile = None	# file descriptor
+
+        self.diagFileName = ''		# diagnostic file name
+        self.errorFileName = ''		# error file name
+
+        self.strainKey = 0		# PRB_Strain._Strain_key
+        self.strainmarkerKey = 0	# PRB_Strain_Marker._StrainMarker_key
+        self.accKey = 0			# ACC_Accession._Accession_key
+        self.mgiKey = 0			# ACC_AccessionMax.maxNumericPart
+        self.startMgiKey = 0		# first MGI ID of this load
+        self.annotKey = 0		# VOC_Annot._Annot_key
+        self.noteKey = 0		# MGI_Note._Note_key
+
+        # diff mode (see loadExisting(), updateStrain(), applyUpdates())
+        self.existingDict = {}		# strain name -> ExistingStrain
+        self.updateStrains = []		# PRB_Strain values to update
+        self.deleteMarkers = []		# _Strain_key of replaced PRB_Strain_Marker rows
+        self.deleteAnnotations = []	# _Strain_key of replaced VOC_Annot rows
+        self.deleteNotes = {}		# _NoteType_key -> _Strain_key of replaced notes
+        self.diffNames = set()		# strain names seen in diff mode
+        self.newStrains = []		# strain names added to the cache by this load
+        self.strainsChecked = False	# strainDict has every strain of the input (checkStrains())
+        self.insertCount = 0
+        self.noopCount = 0
+
+        self.rowCounts = {}		# table -> rows loaded by bcpFiles()
+
+        self.startKeys = {}		# table -> first key of this load
+        self.progress = None		# strainprogress.Progress
+        self.slowQueryLog = None	# strainslowquery.SlowQueryLog
+        self.sqlLog = None		# caller's SQL log settings (see strainloadlib.sqlLogSettings())
+        self.leaser = None		# strainkeys.KeyLeaser (coordinated mode)
+        self.failed = False
+
+    # Purpose: opens a file, raising StrainLoadError if it cannot be opened
+    # Returns: file descriptor
+
+    def openFile(self, fileName, mode):
 
-    return
+        try:
+            return open(fileName, mode)
+        except:
+            raise strainloadlib.StrainLoadError('Could not open file %s\n' % fileName)
 
-# Purpose:  verify Species
-# Returns:  Species Key if Species is valid, else 0
-# Assumes:  nothing
-# Effects:  verifies that the Species exists either in the Species dictionary or the database
-#	writes to the error file if the Species is invalid
-#	adds the Species and key to the Species dictionary if the Species is valid
-# Throws:  nothing
+    # Purpose: opens a bcp file, written in primary key order
+    # Returns: strainbcp.SortedBCPFile
 
-def verifySpecies(
-    species, 	# Species (string)
-    lineNum	# line number (integer)
-    ):
+    def openBCPFile(self, fileName, keyFields = 1):
 
-    global speciesDict
+        try:
+            return strainbcp.SortedBCPFile(fileName, keyFields)
+        except:
+            raise strainloadlib.StrainLoadError('Could not open file %s\n' % fileName)
 
-    if len(speciesDict) == 0:
-        results = db.sql('select _Term_key, term from VOC_Term where _Vocab_key = 26', 'auto')
+    # Purpose: runs the whole load
+    # Returns: nothing
+    # Assumes: nothing
+    # Effects: see init(), setPrimaryKeys(), processFile(), bcpFiles()
+    # Throws: StrainLoadError
 
-        for r in results:
-            speciesDict[r['term']] = r['_Term_key']
+    def run(self,
+        records = None		# iterator of records; default is the input file
+        ):
 
-    if species in speciesDict:
-            speciesKey = speciesDict[species]
-    else:
-            errorFile.write('Invalid Species (%d) %s\n' % (lineNum, species))
-            speciesKey = 0
+        try:
+            self.init()
+            if self.config.profile:
+                import strainprofile
+                self.diagFile.write('Profile: %s.profile\n' % (self.profileBaseName()))
+                strainprofile.run(self.profileBaseName(), self.load, records)
+            else:
+                self.load(records)
+        except BaseException:
+            self.failed = True
+            raise
+        finally:
+            self.close()
+
+    # Purpose: loads the records (everything after init())
+    # Returns: nothing
+    # Assumes: init() has been called
+    # Effects: see setPrimaryKeys(), processFile(), bcpFiles()
+    # Throws: StrainLoadError
+
+    def load(self, records = None):
+
+        if self.config.coordinate:
+            # key leases are sized from the records
+            if records is None:
+                records = self.openRecords()
+            records = list(records)
+            self.recordCount = len(records)
+
+        self.setPrimaryKeys(records)
+        self.processFile(records)
+        self.bcpFiles()
+
+        # new strains and accession ids, for the lookup daemon
+        self.cache.report(dict([(table, (self.startKeys[table], nextKey - 1))
+            for table, nextKey in ((strainTable, self.strainKey), (accTable, self.accKey))
+            if nextKey > self.startKeys[table]]))
+
+        if self.config.analyze:
+            self.analyzeTables()
+
+    # Purpose: refreshes the statistics of the tables this load changed enough
+    # Returns: nothing
+    # Assumes: bcpFiles() has been called
+    # Effects: see strainanalyze.py
+    # Throws: nothing
+
+    def analyzeTables(self):
+
+        import strainanalyze
+
+        self.setPhase('analyze')
+        config = self.config
+
+        rowCounts = dict(self.rowCounts)
+        rowCounts[strainTable] = rowCounts.get(strainTable, 0) + len(self.updateStrains)
+
+        tables = strainanalyze.chooseTables(self.db, self.diagFile, rowCounts, config.analyzeFraction)
+        strainanalyze.analyzeTables(self.db.get_sqlServer(), self.db.get_sqlDatabase(),
+            config.user, config.passwordFileName, self.diagFile, tables)
+
+    # Purpose: returns the profile file name (without suffix),
+    #	next to the diagnostics file
+    # Returns: string
+
+    def profileBaseName(self):
+
+        return os.path.splitext(self.diagFileName)[0]
+
+    # Purpose: writes the end time and closes the log/input files
+    #	and the connection (if the loader opened it)
+    # Returns: nothing
+    # Assumes: nothing
+    # Effects: closes files
+    # Throws: nothing
+
+    def close(self):
+
+        if self.progress is not None:
+            self.progress.stop('failed' if self.failed else 'done')
+            self.progress = None
+
+        # lookups made by this load, for the lookup daemon
+        self.cache.flush()
+
+        # the strains of a failed load may or may not have been loaded:
+        # forget them, so that the next load looks them up again
+        if self.failed and self.newStrains:
+            for name in self.newStrains:
+                self.cache.strainDict.pop(name, None)
+            self.newStrains = []
+
+        if self.slowQueryLog is not None:
+            try:
+                self.slowQueryLog.uninstall()
+            except:
+                pass
+            self.slowQueryLog = None
 
-    return speciesKey
+        try:
+            self.diagFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
+            self.errorFile.write('\n\nEnd Date/Time: %s\n' % (mgi_utils.date()))
+            self.diagFile.close()
+            self.errorFile.close()
+        except:
+            pass
 
-# Purpose:  verify Strain Type
-# Returns:  Strain Type Key if Strain Type is valid, else 0
-# Assumes:  nothing
-# Effects:  verifies that the Strain Type exists either in the Strain Type dictionary or the database
-#	writes to the error file if the Strain Type is invalid
-#	adds the Strain Type and key to the Strain Type dictionary if the Strain Type is valid
-# Throws:  nothing
+        for f in (self.inputFile, self.strainFile, self.markerFile, self.accFile,
+                  self.annotFile, self.noteFile, self.noteChunkFile):
+            try:
+                f.close()
+            except:
+                pass
 
-def verifyStrainType(
-    strainType, 	# Strain Type (string)
-    lineNum		# line number (integer)
-    ):
+        if self.leaser is not None:
+            try:
+                self.leaser.release()
+            except:
+                pass
 
-    global strainTypesDict
+        if self.sqlLog is not None:
+            strainloadlib.restoreSqlLog(self.db, self.sqlLog)
+            self.sqlLog = None
 
-    if len(strainTypesDict) == 0:
-        results = db.sql('select _Term_key, term from VOC_Term where _Vocab_key = 55', 'auto')
+        if self.ownConnection:
+            self.db.useOneConnection(0)
 
-        for r in results:
-            strainTypesDict[r['term']] = r['_Term_key']
+    # Purpose: opens the connection and the output/log files
+    # Returns: nothing
+    # Assumes: nothing
+    # Effects: initializes file descriptors
+    # Throws: StrainLoadError if files cannot be opened
 
-    if strainType in strainTypesDict:
-            strainTypeKey = strainTypesDict[strainType]
-    else:
-            errorFile.write('Invalid Strain Type (%d) %s\n' % (lineNum, strainType))
-            strainTypeKey = 0
+    def init(self):
 
-    return strainTypeKey
+        config = self.config
 
-# Purpose:  verify Strain
-# Returns:  Strain Key if Strain is valid, else 0
-# Assumes:  nothing
-# Effects:  verifies that the Strain exists either in the Strain dictionary or the database
-#	writes to the error file if the Strain is invalid
-#	adds the Strain and key to the Strain dictionary if the Strain Type is valid
-# Throws:  nothing
+        if config.trace:
+            self.db.setTrace()
 
-def verifyStrain(
-    strain, 	# Strain (string)
-    lineNum	# line number (integer)
-    ):
+        if self.ownConnection:
+            self.db.useOneConnection(1)
+            self.db.set_sqlUser(config.user)
+            self.db.set_sqlPasswordFromFile(config.passwordFileName)
+ 
+        fdate = mgi_utils.date('%m%d%Y')	# current date
+        tail = config.logBaseName()
+        self.diagFileName = config.outputPath(tail + '.' + fdate + '.diagnostics')
+        self.errorFileName = config.outputPath(tail + '.' + fdate + '.error')
+
+        self.diagFile = self.openFile(self.diagFileName, 'w')
+        self.errorFile = self.openFile(self.errorFileName, 'w')
+        self.strainFile = self.openBCPFile(config.outputPath(strainFileName))
+        self.markerFile = self.openBCPFile(config.outputPath(markerFileName))
+        self.accFile = self.openBCPFile(config.outputPath(accFileName))
+        self.noteFile = self.openBCPFile(config.outputPath(noteFileName))
+        self.noteChunkFile = self.openBCPFile(config.outputPath(noteChunkFileName), 2)
+        self.annotFile = self.openBCPFile(config.outputPath(annotFileName))
+
+        # Log all SQL (the caller's settings are restored by close())
+        if not self.ownConnection:
+            self.sqlLog = strainloadlib.sqlLogSettings(self.db, False)
+        self.db.set_sqlLogFunction(self.db.sqlLogAll)
+
+        if config.progressInterval > 0:
+            import strainprogress
+            self.progress = strainprogress.Progress(os.path.splitext(self.diagFileName)[0] + '.status',
+                self.snapshot, config.progressInterval)
+            self.progress.start()
+
+        if config.slowQuery > 0:
+            import strainslowquery
+            self.slowQueryLog = strainslowquery.SlowQueryLog(self.db,
+                os.path.splitext(self.diagFileName)[0] + '.slowqueries', config.slowQuery)
+            self.slowQueryLog.install()
+
+        # a warm cache is refreshed, so that it has the strains of loads
+        # that ran since it was attached
+        if config.lookupSocket or self.cache.client is not None:
+            try:
+                self.cache.attach(config.lookupSocket)
+                self.diagFile.write('Lookup daemon: %s\n' % (config.lookupSocket))
+            except (OSError, ValueError) as message:
+                self.diagFile.write('Lookup daemon %s not used: %s\n' % (config.lookupSocket, message))
+
+        self.diagFile.write('Start Date/Time: %s\n' % (mgi_utils.date()))
+        self.diagFile.write('Server: %s\n' % (self.db.get_sqlServer()))
+        self.diagFile.write('Database: %s\n' % (self.db.get_sqlDatabase()))
+
+        self.errorFile.write('Start Date/Time: %s\n\n' % (mgi_utils.date()))
+
+    # Purpose: sets the phase shown by the progress reporter
+    # Returns: nothing
+
+    def setPhase(self, phase):
+
+        if self.progress is not None:
+            self.progress.setPhase(phase)
+
+    # Purpose: returns the counters shown by the progress reporter
+    # Returns: dictionary (see strainprogress.Progress)
+    # Assumes: nothing
+    # Effects: nothing
+    # Throws: nothing
+    #
+    # Rows per table are the distance between the current and first
+    # keys, so the load keeps no extra counters.
+
+    def snapshot(self):
+
+        rows = {}
+        if self.startKeys:
+            rows[strainTable] = self.strainKey - self.startKeys[strainTable]
+            rows[markerTable] = self.strainmarkerKey - self.startKeys[markerTable]
+            rows[accTable] = self.accKey - self.startKeys[accTable]
+            rows[annotTable] = self.annotKey - self.startKeys[annotTable]
+            rows[noteTable] = self.noteKey - self.startKeys[noteTable]
+            rows[noteChunkTable] = rows[noteTable]
+            if self.config.diff:
+                rows[strainTable + ' updates'] = len(self.updateStrains)
+
+        if self.recordCount:
+            fraction = self.lineNum / self.recordCount
+        elif self.inputFile is not None:
+            fraction = self.inputFile.fraction()
+        else:
+            fraction = None
+
+        return {'lines' : self.lineNum, 'rejected' : self.errorCount, 'rows' : rows, 'fraction' : fraction}
+
+    # Purpose: opens the configured input file
+    # Returns: iterator of records
+    # Throws: StrainLoadError if the file cannot be opened
+
+    def openRecords(self):
+
+        self.inputFile = strainloadlib.RecordReader(self.config.inputFileName, numFields)
+        return iter(self.inputFile)
+
+    # Purpose:  verify Species
+    # Returns:  Species Key if Species is valid, else 0
+    # Assumes:  nothing
+    # Effects:  verifies that the Species exists in the Species dictionary
+    #	writes to the error file if the Species is invalid
+    # Throws:  nothing
+
+    def verifySpecies(self,
+        species, 	# Species (string)
+        lineNum		# line number (integer)
+        ):
+
+        speciesDict = self.cache.species(self.db)
+
+        if species in speciesDict:
+            speciesKey = speciesDict[species]
+        else:
+            self.errorFile.write('Invalid Species (%d) %s\n' % (lineNum, species))
+            speciesKey = 0
 
-    global strainDict
+        return speciesKey
 
-    results = db.sql('select _Strain_key, strain from PRB_Strain where strain = \'%s\'' % (strain), 'auto')
+    # Purpose:  verify Strain Type
+    # Returns:  Strain Type Key if Strain Type is valid, else 0
+    # Assumes:  nothing
+    # Effects:  verifies that the Strain Type exists in the Strain Type dictionary
+    #	writes to the error file if the Strain Type is invalid
+    # Throws:  nothing
 
-    for r in results:
-        strainDict[r['strain']] = r['_Strain_key']
+    def verifyStrainType(self,
+        strainType, 	# Strain Type (string)
+        lineNum		# line number (integer)
+        ):
 
-    if strain in strainDict:
-            strainExistKey = strainDict[strain]
-            errorFile.write('Strain Already Exists (%d) %s\n' % (lineNum, strain))
-    else:
-            #errorFile.write('Invalid Strain (%d) %s\n' % (lineNum, strain))
-            strainExistKey = 0
+        strainTypesDict = self.cache.strainTypes(self.db)
 
-    return strainExistKey
+        if strainType in strainTypesDict:
+            strainTypeKey = strainTypesDict[strainType]
+        else:
+            self.errorFile.write('Invalid Strain Type (%d) %s\n' % (lineNum, strainType))
+            strainTypeKey = 0
 
-# Purpose:  sets global primary key variables
-# Returns:  nothing
-# Assumes:  nothing
-# Effects:  sets global primary key variables
-# Throws:   nothing
+        return strainTypeKey
 
-def setPrimaryKeys():
+    # Purpose:  verify Strain
+    # Returns:  Strain Key if Strain already exists, else 0
+    # Assumes:  nothing
+    # Effects:  verifies that the Strain exists either in the Strain dictionary or the database
+    #	writes to the error file if the Strain already exists
+    #	adds the Strain and key to the Strain dictionary if the Strain exists
+    # Throws:  nothing
 
-    global strainKey, strainmarkerKey, accKey, mgiKey, annotKey, noteKey
+    def verifyStrain(self,
+        strain, 	# Strain (string)
+        lineNum		# line number (integer)
+        ):
 
-    results = db.sql(''' select nextval('prb_strain_seq') as maxKey ''', 'auto')
-    strainKey = results[0]['maxKey']
+        strainDict = self.cache.strainDict
 
-    results = db.sql(''' select nextval('prb_strain_marker_seq') as maxKey ''', 'auto')
-    strainmarkerKey = results[0]['maxKey']
+        # after checkStrains(), a strain missing from strainDict is new
+        if strain not in strainDict and not self.strainsChecked:
+            results = self.db.sql('select _Strain_key, strain from PRB_Strain where strain = \'%s\'' % (strain), 'auto')
+            for r in results:
+                strainDict[r['strain']] = r['_Strain_key']
 
-    results = db.sql('select max(_Accession_key) + 1 as maxKey from ACC_Accession', 'auto')
-    accKey = results[0]['maxKey']
+        if strain in strainDict:
+            strainExistKey = strainDict[strain]
+            self.errorFile.write('Strain Already Exists (%d) %s\n' % (lineNum, strain))
+        else:
+            strainExistKey = 0
 
-    results = db.sql('select maxNumericPart + 1 as maxKey from ACC_AccessionMax where prefixPart = \'%s\'' % (mgiPrefix), 'auto')
-    mgiKey = results[0]['maxKey']
+        return strainExistKey
 
-    results = db.sql(''' select nextval('voc_annot_seq') as maxKey ''', 'auto')
-    annotKey = results[0]['maxKey']
+    # Purpose:  looks up the strains of the records that are not in strainDict
+    # Returns:  nothing
+    # Assumes:  nothing
+    # Effects:  adds the existing strains to strainDict, one query per
+    #	batch of names; the daemon's map may miss strains committed out
+    #	of key order (coordinated loads, editors) or dated at midnight
+    #	(bcp loads), so a name missing from it is not proof of a new strain
+    # Throws:   nothing
 
-    results = db.sql('select max(_Note_key) + 1 as maxKey from MGI_Note', 'auto')
-    noteKey = results[0]['maxKey']
+    def checkStrains(self, records):
 
-# Purpose:  processes data
-# Returns:  nothing
-# Assumes:  nothing
-# Effects:  verifies and processes each line in the input file
-# Throws:   nothing
+        strainDict = self.cache.strainDict
+        names = sorted(set([tokens[1] for tokens in records if len(tokens) > 1 and tokens[1] not in strainDict]))
 
-def processFile():
+        for batch in strainloadlib.batches(names):
+            results = self.db.sql('''
+                select _Strain_key, strain
+                from PRB_Strain
+                where strain in (%s)
+                ''' % (','.join([sqlString(n) for n in batch])), 'auto')
+            for r in results:
+                strainDict[r['strain']] = r['_Strain_key']
 
-    global lineNum
-    global strainKey, strainmarkerKey, accKey, mgiKey, annotKey, noteKey
+        self.strainsChecked = True
 
-    # For each line in the input file
+    # Purpose:  sets primary key counters
+    # Returns:  nothing
+    # Assumes:  nothing
+    # Effects:  sets primary key counters
+    #	in coordinated mode, leases key ranges (see strainkeys.py)
+    # Throws:   nothing
 
-    for line in inputFile.readlines():
+    def setPrimaryKeys(self,
+        records = None		# list of records (coordinated mode)
+        ):
 
-        error = 0
-        lineNum = lineNum + 1
+        self.setPhase('setPrimaryKeys')
+        db = self.db
 
-        # Split the line into tokens
-        tokens = line[:-1].split('\t')
+        if self.config.coordinate:
+            self.leaseKeys(records)
+            return
 
-        try:
-            id = tokens[0]
-            externalPrefix = id
-            externalNumeric = ''
-            #(externalPrefix, externalNumeric) = id.split(':')
-            name = tokens[1]
-            alleleIDs = tokens[2]
-            strainType = tokens[3]
-            species = tokens[4]
-            isStandard = tokens[5]
-            sooNote = tokens[6]
-            externalLDB = tokens[7]
-            externalTypeKey = tokens[8]
-            annotations = tokens[9]
-            createdBy = tokens[10]
-            mutantNote = tokens[11]
-            isPrivate = tokens[12]
-            impcColonyNote = tokens[13]
-        except:
-            exit(1, 'Invalid Line (%d): %s\n' % (lineNum, line))
-
-        strainExistKey = verifyStrain(name, lineNum)
-        strainTypeKey = verifyStrainType(strainType, lineNum)
-        speciesKey = verifySpecies(species, lineNum)
-        createdByKey = loadlib.verifyUser(createdBy, 0, errorFile)
-
-        if strainExistKey > 0 or strainTypeKey == 0 or speciesKey == 0 or createdByKey == 0:
-            # set error flag to true
-            error = 1
-
-        # if errors, continue to next record
-        if error:
-            continue
-
-        # if no errors, process
-
-        strainFile.write('%d|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
-            % (strainKey, speciesKey, strainTypeKey, name, isStandard, isPrivate, isGeneticBackground,
-	       createdByKey, createdByKey, cdate, cdate))
-
-	# if Allele found, resolve to Marker
-
-        if len(alleleIDs) > 0:
-            allAlleles = alleleIDs.split('|')
-            for a in allAlleles:
-                alleleKey = loadlib.verifyObject(a, alleleTypeKey, None, lineNum, errorFile)
-                if alleleKey == 0:
-                    continue
-                if alleleKey == None:
-                    continue
-                results = db.sql('select _Marker_key from ALL_Allele where _Allele_key = %s' % (alleleKey),  'auto')
-                markerKey = results[0]['_Marker_key']
-                if markerKey != None:
-                    markerFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
-                    % (strainmarkerKey, strainKey, markerKey, alleleKey, qualifierKey, 
-                    createdByKey, createdByKey, cdate, cdate))
-                else:
-                    markerFile.write('%s|%s||%s|%s|%s|%s|%s|%s\n' \
-                    % (strainmarkerKey, strainKey, alleleKey, qualifierKey, 
-                    createdByKey, createdByKey, cdate, cdate))
-                strainmarkerKey = strainmarkerKey + 1
+        results = db.sql(''' select nextval('prb_strain_seq') as maxKey ''', 'auto')
+        self.strainKey = results[0]['maxKey']
 
-        # MGI Accession ID for all strain
+        results = db.sql(''' select nextval('prb_strain_marker_seq') as maxKey ''', 'auto')
+        self.strainmarkerKey = results[0]['maxKey']
 
-        accFile.write('%d|%s%d|%s|%s|1|%d|%d|0|1|%s|%s|%s|%s\n' \
-                % (accKey, mgiPrefix, mgiKey, mgiPrefix, mgiKey, strainKey, mgiTypeKey, 
-                createdByKey, createdByKey, cdate, cdate))
-        accKey = accKey + 1
+        results = db.sql('select max(_Accession_key) + 1 as maxKey from ACC_Accession', 'auto')
+        self.accKey = results[0]['maxKey']
 
-        # external accession id
-        # % (accKey, id, '', id, externalLDB, strainKey, externalTypeKey, 
-        #for ids that contain prefix:numeric
-        accFile.write('%d|%s|%s|%s|%s|%s|%s|0|1|%s|%s|%s|%s\n' \
-          % (accKey, id, externalPrefix, externalNumeric, externalLDB, strainKey, externalTypeKey, 
-             createdByKey, createdByKey, cdate, cdate))
-        accKey = accKey + 1
+        results = db.sql('select maxNumericPart + 1 as maxKey from ACC_AccessionMax where prefixPart = \'%s\'' % (mgiPrefix), 'auto')
+        self.mgiKey = results[0]['maxKey']
 
-        # storing data in MGI_Note/MGI_NoteChunk
-        # Strain of Origin Note
+        results = db.sql(''' select nextval('voc_annot_seq') as maxKey ''', 'auto')
+        self.annotKey = results[0]['maxKey']
 
-        if len(sooNote) > 0:
-
-            noteFile.write('%s|%s|%s|%s|%s|%s|%s|%s\n' \
-                % (noteKey, strainKey, mgiNoteObjectKey, mgiStrainOriginTypeKey, \
-                   createdByKey, createdByKey, cdate, cdate))
+        results = db.sql('select max(_Note_key) + 1 as maxKey from MGI_Note', 'auto')
+        self.noteKey = results[0]['maxKey']
 
-            noteChunkFile.write('%s|%s|%s|%s|%s|%s|%s\n' \
-                % (noteKey, 1, sooNote, createdByKey, createdByKey, cdate, cdate))
+        self.startKeys = {strainTable : self.strainKey, markerTable : self.strainmarkerKey,
+            accTable : self.accKey, annotTable : self.annotKey, noteTable : self.noteKey}
+        self.startMgiKey = self.mgiKey
 
-            noteKey = noteKey + 1
+    # Purpose:  leases the key ranges this load may use
+    # Returns:  nothing
+    # Assumes:  coordinated mode
+    # Effects:  sets primary key counters; see strainkeys.KeyLeaser
+    # Throws:   nothing
+    #
+    # Each record uses at most: 1 strain, 1 MGI ID, 2 accessions,
+    # 3 notes, 1 marker per allele ID and 1 annotation per attribute.
+
+    def leaseKeys(self, records):
+
+        import strainkeys
+
+        numRecords = max(len(records), 1)
+        numAlleles = 1
+        numAnnots = 1
+        for tokens in records:
+            if len(tokens) > 9:
+                numAlleles = numAlleles + len(tokens[2].split('|'))
+                numAnnots = numAnnots + len(tokens[9].split('|'))
+
+        self.leaser = strainkeys.KeyLeaser(self.db, self.diagFile, self.config.blockSize)
+
+        self.strainKey = self.leaser.leaseSequence('prb_strain_seq', numRecords)
+        self.strainmarkerKey = self.leaser.leaseSequence('prb_strain_marker_seq', numAlleles)
+        self.annotKey = self.leaser.leaseSequence('voc_annot_seq', numAnnots)
+        self.accKey = self.leaser.leaseMaxKey(accTable, '_Accession_key', 2 * numRecords)
+        self.noteKey = self.leaser.leaseMaxKey(noteTable, '_Note_key', 3 * numRecords)
+        self.mgiKey = self.leaser.leaseMGIIDs(mgiPrefix, numRecords)
+
+        self.startKeys = {strainTable : self.strainKey, markerTable : self.strainmarkerKey,
+            accTable : self.accKey, annotTable : self.annotKey, noteTable : self.noteKey}
+        self.startMgiKey = self.mgiKey
+
+    # Purpose:  processes data
+    # Returns:  nothing
+    # Assumes:  nothing
+    # Effects:  verifies and processes each record
+    #	in diff mode, existing strains are compared with the
+    #	database (see loadExisting()) and updated if they changed
+    # Throws:   StrainLoadError if a record is invalid
+
+    def processFile(self,
+        records = None		# iterator of records; default is the input file
+        ):
+
+        if records is None:
+            records = self.openRecords()
+
+        if self.config.diff:
+            # the existing strains are fetched once, for all records
+            records = list(records)
+            self.recordCount = len(records)
+            self.setPhase('loadExisting')
+            self.loadExisting(records)
+        elif self.cache.client is not None:
+            # the strains missing from the daemon's map are checked
+            # once, for all records
+            records = list(records)
+            self.recordCount = len(records)
+            self.setPhase('checkStrains')
+            self.checkStrains(records)
+
+        self.setPhase('processFile')
+
+        cache = self.cache
+        errorFile = self.errorFile
+        cdate = self.cdate
+
+        # For each record
+
+        for tokens in records:
+
+            error = 0
+            self.lineNum = self.lineNum + 1
+            lineNum = self.lineNum
+
+            try:
+                id = tokens[0]
+                externalPrefix = id
+                externalNumeric = ''
+                #(externalPrefix, externalNumeric) = id.split(':')
+                name = tokens[1]
+                alleleIDs = tokens[2]
+                strainType = tokens[3]
+                species = tokens[4]
+                isStandard = tokens[5]
+                sooNote = tokens[6]
+                externalLDB = tokens[7]
+                externalTypeKey = tokens[8]
+                annotations = tokens[9]
+                createdBy = tokens[10]
+                mutantNote = tokens[11]
+                isPrivate = tokens[12]
+                impcColonyNote = tokens[13]
+            except:
+                raise strainloadlib.StrainLoadError('Invalid Line (%d): %s\n' % (lineNum, TAB.join(tokens)))
+
+            if self.config.diff:
+                existing = self.existingDict.get(name)
+                strainExistKey = 0
+                # a strain is updated (or added) once per load
+                if name in self.diffNames:
+                    self.errorFile.write('Duplicate Strain in input (%d) %s\n' % (lineNum, name))
+                    error = 1
+                self.diffNames.add(name)
+            else:
+                existing = None
+                strainExistKey = self.verifyStrain(name, lineNum)
+
+            strainTypeKey = self.verifyStrainType(strainType, lineNum)
+            speciesKey = self.verifySpecies(species, lineNum)
+            createdByKey = cache.verifyUser(loadlib, createdBy, 0, errorFile)
+
+            if isStandard not in ('0', '1'):
+                errorFile.write('Invalid Standard (%d) %s\n' % (lineNum, isStandard))
+                error = 1
+
+            if isPrivate not in ('0', '1'):
+                errorFile.write('Invalid Private (%d) %s\n' % (lineNum, isPrivate))
+                error = 1
+
+            if strainExistKey > 0 or strainTypeKey == 0 or speciesKey == 0 or createdByKey == 0:
+                # set error flag to true
+                error = 1
+
+            # if errors, continue to next record
+            if error:
+                self.errorCount = self.errorCount + 1
+                continue
+
+            # if no errors, process
+
+            alleles = self.resolveAlleles(alleleIDs, lineNum)
+            annotTermKeys = self.resolveAnnotations(annotations, lineNum)
+            notes = {}
+            if len(sooNote) > 0:
+                notes[mgiStrainOriginTypeKey] = sooNote
+            if len(mutantNote) > 0:
+                notes[mgiMutantOriginTypeKey] = mutantNote
+            if len(impcColonyNote) > 0:
+                notes[mgiIMPCColonyTypeKey] = impcColonyNote
 
-        # storing data in MGI_Note/MGI_NoteChunk
-        # Mutant Cell Line of Origin Note
+            if existing is not None:
+                self.updateStrain(existing, lineNum, name, speciesKey, strainTypeKey, isStandard, isPrivate,
+                    alleles, annotTermKeys, notes, createdByKey)
+                continue
 
-        if len(mutantNote) > 0:
+            self.insertCount = self.insertCount + 1
+            strainKey = self.strainKey
 
-            noteFile.write('%s|%s|%s|%s|%s|%s|%s|%s\n' \
-                % (noteKey, strainKey, mgiNoteObjectKey, mgiMutantOriginTypeKey, \
+            self.strainFile.write('%d|%s|%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
+                % (strainKey, speciesKey, strainTypeKey, name, isStandard, isPrivate, isGeneticBackground,
                    createdByKey, createdByKey, cdate, cdate))
 
-            if len(mutantNote) > 0:
-                noteChunkFile.write('%s|%s|%s|%s|%s|%s|%s\n' \
-                    % (noteKey, 1, mutantNote, createdByKey, createdByKey, cdate, cdate))
+            # a later record, or a later load with the same cache,
+            # sees the strain as existing
+            cache.strainDict[name] = strainKey
+            self.newStrains.append(name)
 
-            noteKey = noteKey + 1
+            self.writeMarkers(strainKey, alleles, createdByKey)
 
-        # storing data in MGI_Note/MGI_NoteChunk
-        # IMPC Colony Note
+            # MGI Accession ID for all strain
 
-        if len(impcColonyNote) > 0:
+            self.accFile.write('%d|%s%d|%s|%s|1|%d|%d|0|1|%s|%s|%s|%s\n' \
+                    % (self.accKey, mgiPrefix, self.mgiKey, mgiPrefix, self.mgiKey, strainKey, mgiTypeKey, 
+                    createdByKey, createdByKey, cdate, cdate))
+            self.accKey = self.accKey + 1
 
-            noteFile.write('%s|%s|%s|%s|%s|%s|%s|%s\n' \
-                % (noteKey, strainKey, mgiNoteObjectKey, mgiIMPCColonyTypeKey, \
-                   createdByKey, createdByKey, cdate, cdate))
+            # external accession id
+            # % (accKey, id, '', id, externalLDB, strainKey, externalTypeKey, 
+            #for ids that contain prefix:numeric
+            self.accFile.write('%d|%s|%s|%s|%s|%s|%s|0|1|%s|%s|%s|%s\n' \
+              % (self.accKey, id, externalPrefix, externalNumeric, externalLDB, strainKey, externalTypeKey, 
+                 createdByKey, createdByKey, cdate, cdate))
+            self.accKey = self.accKey + 1
 
-            noteChunkFile.write('%s|%s|%s|%s|%s|%s|%s\n' \
-                % (noteKey, 1, sooNote, createdByKey, createdByKey, cdate, cdate))
+            # storing data in MGI_Note/MGI_NoteChunk
+            # Strain of Origin, Mutant Cell Line of Origin, IMPC Colony Notes
 
-            noteKey = noteKey + 1
+            for noteTypeKey in noteTypeKeys:
+                if noteTypeKey in notes:
+                    self.writeNote(strainKey, noteTypeKey, notes[noteTypeKey], createdByKey)
 
-        #
-        # Annotations
-        #
-        # _AnnotType_key = 1009
-        # _Qualifier_ke = 1614158
-        #
-
-        if len(annotations) > 0:
-            annotations = annotations.split('|')
-            for a in annotations:
+            self.writeAnnotations(strainKey, annotTermKeys)
 
-                # strain annotation type
-                annotTypeKey = 1009
+            self.mgiKey = self.mgiKey + 1
+            self.strainKey = self.strainKey + 1
 
-                # this is a null qualifier key
-                annotQualifierKey = 1614158
+        #	end of "for tokens in records:"
 
-                annotTermKey = loadlib.verifyTerm('', 27, a, lineNum, errorFile)
-                if annotTermKey == 0:
-                    continue
-    
-                annotFile.write('%s|%s|%s|%s|%s|%s|%s\n' \
-                  % (annotKey, annotTypeKey, strainKey, annotTermKey, annotQualifierKey, cdate, cdate))
-                annotKey = annotKey + 1
+        if self.config.diff:
+            self.diagFile.write('\nStrains inserted: %d\n' % (self.insertCount))
+            self.diagFile.write('Strains updated: %d\n' % (len(self.updateStrains)))
+            self.diagFile.write('Strains unchanged: %d\n\n' % (self.noopCount))
 
-        mgiKey = mgiKey + 1
-        strainKey = strainKey + 1
+    # Purpose:  resolves the Allele IDs of a record
+    # Returns:  list of (Allele Key, Marker Key); Marker Key may be None
+    # Assumes:  nothing
+    # Effects:  writes invalid Allele IDs to the error file
+    # Throws:   nothing
 
-    #	end of "for line in inputFile.readlines():"
+    def resolveAlleles(self, alleleIDs, lineNum):
 
-def bcpFiles():
-    '''
-    # requires:
-    #
-    # effects:
-    #	BCPs the data into the database
-    #
-    # returns:
-    #	nothing
-    #
-    '''
+        alleles = []
 
-    db.commit()
-    strainFile.flush()
-    markerFile.flush()
-    accFile.flush()
-    annotFile.flush()
-    noteFile.flush()
-    noteChunkFile.flush()
+        if len(alleleIDs) == 0:
+            return alleles
 
-    bcpCommand = os.environ['PG_DBUTILS'] + '/bin/bcpin.csh'
-    currentDir = os.getcwd()
+        for a in alleleIDs.split('|'):
+            alleleKey = self.cache.verifyObject(loadlib, a, alleleTypeKey, lineNum, self.errorFile)
+            if alleleKey == 0:
+                continue
+            if alleleKey == None:
+                continue
+            markerKey = self.cache.alleleMarker(self.db, alleleKey)
+            alleles.append((alleleKey, markerKey or None))
 
-    bcp1 = '%s %s %s %s %s %s "|" "\\n" mgd' % \
-        (bcpCommand, db.get_sqlServer(), db.get_sqlDatabase(), 'PRB_Strain', currentDir, strainFileName)
+        return alleles
 
-    bcp2 = '%s %s %s %s %s %s "|" "\\n" mgd' % \
-        (bcpCommand, db.get_sqlServer(), db.get_sqlDatabase(), 'PRB_Strain_Marker', currentDir, markerFileName)
+    # Purpose:  resolves the Strain Attributes of a record
+    # Returns:  list of Term keys
+    # Assumes:  nothing
+    # Effects:  writes invalid Attributes to the error file
+    # Throws:   nothing
 
-    bcp3 = '%s %s %s %s %s %s "|" "\\n" mgd' % \
-        (bcpCommand, db.get_sqlServer(), db.get_sqlDatabase(), 'ACC_Accession', currentDir, accFileName)
+    def resolveAnnotations(self, annotations, lineNum):
 
-    bcp4 = '%s %s %s %s %s %s "|" "\\n" mgd' % \
-        (bcpCommand, db.get_sqlServer(), db.get_sqlDatabase(), 'VOC_Annot', currentDir, annotFileName)
+        annotTermKeys = []
 
-    bcp5 = '%s %s %s %s %s %s "|" "\\n" mgd' % \
-        (bcpCommand, db.get_sqlServer(), db.get_sqlDatabase(), 'MGI_Note', currentDir, noteFileName)
+        if len(annotations) == 0:
+            return annotTermKeys
 
-    bcp6 = '%s %s %s %s %s %s "|" "\\n" mgd' % \
-        (bcpCommand, db.get_sqlServer(), db.get_sqlDatabase(), 'MGI_NoteChunk', currentDir, noteChunkFileName)
+        for a in annotations.split('|'):
+            annotTermKey = self.cache.verifyTerm(loadlib, a, 27, lineNum, self.errorFile)
+            if annotTermKey == 0:
+                continue
+            annotTermKeys.append(annotTermKey)
 
-    diagFile.write('%s\n' % bcp1)
-    diagFile.write('%s\n' % bcp2)
-    diagFile.write('%s\n' % bcp3)
-    diagFile.write('%s\n' % bcp4)
-    diagFile.write('%s\n' % bcp5)
-    diagFile.write('%s\n' % bcp6)
+        return annotTermKeys
 
-    os.system(bcp1)
-    os.system(bcp2)
-    os.system(bcp3)
-    os.system(bcp4)
-    os.system(bcp5)
-    os.system(bcp6)
+    # Purpose:  writes the PRB_Strain_Marker rows of a strain
+    # Returns:  nothing
+    # Assumes:  nothing
+    # Effects:  writes to the marker file, increments the strain/marker key
+    # Throws:   nothing
 
-    # update the AccessionMax value
-    db.sql('select * from ACC_setMax (%d)' % (lineNum), None)
-    db.commit()
+    def writeMarkers(self, strainKey, alleles, createdByKey):
 
-    # update prb_strain_seq auto-sequence
-    db.sql(''' select setval('prb_strain_seq', (select max(_Strain_key) from PRB_Strain)) ''', None)
-    db.commit()
+        cdate = self.cdate
 
-    # update prb_strain_marker_seq auto-sequence
-    db.sql(''' select setval('prb_strain_marker_seq', (select max(_StrainMarker_key) from PRB_Strain_Marker)) ''', None)
-    db.commit()
+        for alleleKey, markerKey in alleles:
+            if markerKey != None:
+                self.markerFile.write('%s|%s|%s|%s|%s|%s|%s|%s|%s\n' \
+                % (self.strainmarkerKey, strainKey, markerKey, alleleKey, qualifierKey, 
+                createdByKey, createdByKey, cdate, cdate))
+            else:
+                self.markerFile.write('%s|%s||%s|%s|%s|%s|%s|%s\n' \
+                % (self.strainmarkerKey, strainKey, alleleKey, qualifierKey, 
+                createdByKey, createdByKey, cdate, cdate))
+            self.strainmarkerKey = self.strainmarkerKey + 1
 
-    # update voc_annot_seq auto-sequence
-    db.sql(''' select setval('voc_annot_seq', (select max(_Annot_key) from VOC_Annot)) ''', None)
-    db.commit()
+    # Purpose:  writes the VOC_Annot rows of a strain
+    # Returns:  nothing
+    # Assumes:  nothing
+    # Effects:  writes to the annotation file, increments the annotation key
+    # Throws:   nothing
+    #
+    # _AnnotType_key = 1009
+    # _Qualifier_key = 1614158 (null qualifier)
+
+    def writeAnnotations(self, strainKey, annotTermKeys):
+
+        cdate = self.cdate
+
+        for annotTermKey in annotTermKeys:
+            self.annotFile.write('%s|%s|%s|%s|%s|%s|%s\n' \
+              % (self.annotKey, annotTypeKey, strainKey, annotTermKey, annotQualifierKey, cdate, cdate))
+            self.annotKey = self.annotKey + 1
+
+    # Purpose:  writes one MGI_Note/MGI_NoteChunk
+    # Returns:  nothing
+    # Assumes:  nothing
+    # Effects:  writes to the note/note chunk files, increments the note key
+    # Throws:   nothing
+
+    def writeNote(self, strainKey, noteTypeKey, note, createdByKey):
+
+        cdate = self.cdate
+
+        self.noteFile.write('%s|%s|%s|%s|%s|%s|%s|%s\n' \
+            % (self.noteKey, strainKey, mgiNoteObjectKey, noteTypeKey, \
+               createdByKey, createdByKey, cdate, cdate))
+
+        self.noteChunkFile.write('%s|%s|%s|%s|%s|%s|%s\n' \
+            % (self.noteKey, 1, note, createdByKey, createdByKey, cdate, cdate))
+
+        self.noteKey = self.noteKey + 1
+
+    # Purpose:  fetches the current state of the strains named in the records
+    # Returns:  nothing
+    # Assumes:  diff mode
+    # Effects:  sets existingDict (strain name -> ExistingStrain)
+    #	one query per table per batch of names, hash-joined here
+    # Throws:   nothing
+
+    def loadExisting(self, records):
+
+        db = self.db
+        names = sorted(set([tokens[1] for tokens in records if len(tokens) > 1]))
+        byKey = {}
+
+        for batch in strainloadlib.batches(names):
+            results = db.sql('''
+                select _Strain_key, strain, _Species_key, _StrainType_key, standard, private
+                from PRB_Strain
+                where strain in (%s)
+                ''' % (','.join([sqlString(n) for n in batch])), 'auto')
+            for r in results:
+                e = ExistingStrain(r)
+                self.existingDict[e.name] = e
+                byKey[e.strainKey] = e
+
+        for batch in strainloadlib.batches(sorted(byKey)):
+            keys = ','.join(['%d' % (k) for k in batch])
+
+            results = db.sql('''
+                select _Strain_key, _Allele_key
+                from PRB_Strain_Marker
+                where _Strain_key in (%s)
+                and _Qualifier_key = %d
+                and _Allele_key is not null
+                ''' % (keys, qualifierKey), 'auto')
+            for r in results:
+                byKey[r['_Strain_key']].alleleKeys.append(r['_Allele_key'])
+
+            results = db.sql('''
+                select _Object_key, _Term_key
+                from VOC_Annot
+                where _Object_key in (%s)
+                and _AnnotType_key = %d
+                ''' % (keys, annotTypeKey), 'auto')
+            for r in results:
+                byKey[r['_Object_key']].annotTermKeys.append(r['_Term_key'])
+
+            results = db.sql('''
+                select n._Object_key, n._NoteType_key, c.note
+                from MGI_Note n, MGI_NoteChunk c
+                where n._Object_key in (%s)
+                and n._MGIType_key = %d
+                and n._NoteType_key in (%s)
+                and n._Note_key = c._Note_key
+                order by n._Object_key, n._NoteType_key, c.sequenceNum
+                ''' % (keys, mgiNoteObjectKey, ','.join(['%d' % (k) for k in noteTypeKeys])), 'auto')
+            for r in results:
+                notes = byKey[r['_Object_key']].notes
+                notes[r['_NoteType_key']] = notes.get(r['_NoteType_key'], '') + r['note']
+
+    # Purpose:  compares a record with its existing strain
+    # Returns:  nothing
+    # Assumes:  diff mode
+    # Effects:  queues the set-based updates (see applyUpdates())
+    #	and writes the replacement marker/annotation/note rows
+    # Throws:   nothing
+
+    def updateStrain(self, existing, lineNum, name, speciesKey, strainTypeKey, isStandard, isPrivate,
+        alleles, annotTermKeys, notes, createdByKey):
+
+        strainKey = existing.strainKey
+        changed = []
+
+        if (speciesKey, strainTypeKey, isStandard, isPrivate) != \
+           (existing.speciesKey, existing.strainTypeKey, str(existing.standard), str(existing.private)):
+            self.updateStrains.append((strainKey, speciesKey, strainTypeKey, isStandard, isPrivate, createdByKey))
+            changed.append('strain')
+
+        if sorted([a[0] for a in alleles]) != sorted(existing.alleleKeys):
+            self.deleteMarkers.append(strainKey)
+            self.writeMarkers(strainKey, alleles, createdByKey)
+            changed.append('alleles')
+
+        if sorted(annotTermKeys) != sorted(existing.annotTermKeys):
+            self.deleteAnnotations.append(strainKey)
+            self.writeAnnotations(strainKey, annotTermKeys)
+            changed.append('attributes')
+
+        for noteTypeKey in noteTypeKeys:
+            if notes.get(noteTypeKey, '') != existing.notes.get(noteTypeKey, ''):
+                self.deleteNotes.setdefault(noteTypeKey, []).append(strainKey)
+                if noteTypeKey in notes:
+                    self.writeNote(strainKey, noteTypeKey, notes[noteTypeKey], createdByKey)
+                changed.append('note %d' % (noteTypeKey))
+
+        if len(changed) == 0:
+            self.noopCount = self.noopCount + 1
+            return
+
+        # strains whose attributes did not change are still marked as modified
+        if 'strain' not in changed:
+            self.updateStrains.append((strainKey, speciesKey, strainTypeKey, isStandard, isPrivate, createdByKey))
+
+        self.diagFile.write('Strain Updated (%d) %s: %s\n' % (lineNum, name, ', '.join(changed)))
+
+    # Purpose:  applies the updates queued by updateStrain()
+    # Returns:  nothing
+    # Assumes:  diff mode; called after the bcp files are loaded
+    # Effects:  updates PRB_Strain; deletes the PRB_Strain_Marker,
+    #	VOC_Annot and MGI_Note rows that the bcp files replace: those
+    #	keyed below the first key of this load, so that a failed bcp
+    #	leaves the old rows in place
+    # Throws:   nothing
+
+    def applyUpdates(self):
+
+        db = self.db
+
+        for batch in strainloadlib.batches(self.updateStrains):
+            db.sql('''
+                update PRB_Strain s
+                set _Species_key = v._Species_key, _StrainType_key = v._StrainType_key,
+                    standard = v.standard, private = v.private,
+                    _ModifiedBy_key = v._ModifiedBy_key, modification_date = now()
+                from (values %s) as v(_Strain_key, _Species_key, _StrainType_key, standard, private, _ModifiedBy_key)
+                where s._Strain_key = v._Strain_key
+                ''' % (','.join(['(%s,%s,%s,%s,%s,%s)' % (r) for r in batch])), None)
+
+        for batch in strainloadlib.batches(self.deleteMarkers):
+            # marker-only rows (ex. from strainalleleload.py) are kept
+            db.sql('delete from PRB_Strain_Marker where _Qualifier_key = %d and _Allele_key is not null and _StrainMarker_key < %d and _Strain_key in (%s)' \
+                % (qualifierKey, self.startKeys[markerTable], ','.join(['%d' % (k) for k in batch])), None)
+
+        for batch in strainloadlib.batches(self.deleteAnnotations):
+            db.sql('delete from VOC_Annot where _AnnotType_key = %d and _Annot_key < %d and _Object_key in (%s)' \
+                % (annotTypeKey, self.startKeys[annotTable], ','.join(['%d' % (k) for k in batch])), None)
+
+        for noteTypeKey in sorted(self.deleteNotes):
+            for batch in strainloadlib.batches(self.deleteNotes[noteTypeKey]):
+                notes = '''
+                    select _Note_key from MGI_Note
+                    where _MGIType_key = %d and _NoteType_key = %d and _Note_key < %d and _Object_key in (%s)
+                    ''' % (mgiNoteObjectKey, noteTypeKey, self.startKeys[noteTable], ','.join(['%d' % (k) for k in batch]))
+                db.sql('delete from MGI_NoteChunk where _Note_key in (%s)' % (notes), None)
+                db.sql('delete from MGI_Note where _Note_key in (%s)' % (notes), None)
+
+        db.commit()
+
+    def bcpFiles(self):
+        '''
+        # requires:
+        #
+        # effects:
+        #	BCPs the data into the database
+        #
+        # returns:
+        #	nothing
+        #
+        '''
+
+        db = self.db
+        config = self.config
+
+        db.commit()
+
+        # each bcp file is written out in primary key order
+        self.strainFile.close()
+        self.markerFile.close()
+        self.accFile.close()
+        self.annotFile.close()
+        self.noteFile.close()
+        self.noteChunkFile.close()
+
+        bcp = strainbcp.BCPLoader(db, self.diagFile, config.outputDir,
+            config.chunkSizes, config.indexThreshold)
+
+        for table, fileName in ((strainTable, strainFileName),
+                                (markerTable, markerFileName),
+                                (accTable, accFileName),
+                                (annotTable, annotFileName),
+                                (noteTable, noteFileName),
+                                (noteChunkTable, noteChunkFileName)):
+            self.setPhase('bcp ' + table)
+            self.rowCounts[table] = bcp.bcpTable(table, fileName)
+
+        # the replaced rows are deleted once their replacements are loaded
+        if config.diff:
+            self.setPhase('applyUpdates')
+            self.applyUpdates()
+
+        self.setPhase('setMax')
+
+        if config.coordinate:
+            # the MGI IDs and sequences were advanced when the keys were leased
+            self.leaser.release()
+            return
+
+        # update the AccessionMax value by the number of MGI IDs assigned
+        if self.mgiKey > self.startMgiKey:
+            db.sql('select * from ACC_setMax (%d)' % (self.mgiKey - self.startMgiKey), None)
+            db.commit()
+
+        # update prb_strain_seq auto-sequence
+        db.sql(''' select setval('prb_strain_seq', (select max(_Strain_key) from PRB_Strain)) ''', None)
+        db.commit()
+
+        # update prb_strain_marker_seq auto-sequence
+        db.sql(''' select setval('prb_strain_marker_seq', (select max(_StrainMarker_key) from PRB_Strain_Marker)) ''', None)
+        db.commit()
+
+        # update voc_annot_seq auto-sequence
+        db.sql(''' select setval('voc_annot_seq', (select max(_Annot_key) from VOC_Annot)) ''', None)
+        db.commit()
 
 #
 # Main
 #
 
-init()
-setPrimaryKeys()
-processFile()
-bcpFiles()
-exit(0)
+if __name__ == '__main__':
+
+    try:
+        options = strainloadlib.parseOptions(sys.argv[1:])
+        config = strainloadlib.StrainLoadConfig.fromEnvironment(trace = True, **options)
+        StrainLoader(config).run()
+    except strainloadlib.StrainLoadError as message:
+        sys.stderr.write('\n' + str(message) + '\n')
+        sys.exit(1)
+
+    sys.exit(0)
@@ -0,0 +1,663 @@
+
+#
+# Program: strainloadlib.py
+#
+# Purpose:
+#
+#	Shared objects for strainload.py and strainalleleload.py:
+#
+#	StrainLoadConfig	explicit load configuration
+#	LookupCache		lookups that may be kept warm across loads,
+#				in-process or by strainlookupd.py
+#	readRecords()		turns an input file into an iterator of records
+#	RecordReader		reads records from a plain (mmap), gzip/bz2/xz
+#				or Parquet/Arrow input file
+#	parseOptions()		command line options common to both loaders
+#	batches()		splits a list for set-based SQL
+#
+#	Nothing in this module touches the database or the environment
+#	at import time, so other loads may import the loaders and run
+#	them in-process.
+#
+# History
+#
+
+import os
+import sys
+import getopt
+import mmap
+import locale
+
+TAB = '\t'		# tab
+CRT = '\n'		# carriage return/newline
+
+blockSize = 1024 * 1024	# bytes decoded at a time from a mapped input file
+batchSize = 65536	# rows read at a time from a Parquet/Arrow input file
+
+# input file suffix -> name of the module used to stream-decompress it
+compressedSuffixes = {'.gz' : 'gzip', '.bz2' : 'bz2', '.xz' : 'lzma'}
+
+parquetSuffixes = ('.parquet', '.pq')
+arrowSuffixes = ('.arrow', '.feather', '.ipc')
+
+class StrainLoadError(Exception):
+    # Raised by the loaders instead of exiting, so that an
+    # orchestrator running several loads in-process may recover.
+    pass
+
+# Purpose: lazily imports the MGI python libraries
+# Returns: (db, mgi_utils, loadlib)
+# Assumes: the MGI python libraries are on sys.path
+# Effects: imports db, mgi_utils and loadlib on first call
+# Throws:  ImportError
+
+def loadModules():
+
+    import db
+    import mgi_utils
+    import loadlib
+
+    return db, mgi_utils, loadlib
+
+class StrainLoadConfig:
+    # Is: the configuration of one strain load
+    # Has: database user/password file, input file name, output directory
+    # Does: builds itself from the environment (see fromEnvironment())
+
+    def __init__(self,
+        user = None,			# database user (string)
+        passwordFileName = None,	# database password file (string)
+        inputFileName = None,		# input file (string)
+        outputDir = None,		# directory for bcp/log files (string)
+        trace = False,			# call db.setTrace() (boolean)
+        profile = False,		# run under strainprofile (boolean)
+        diff = False,			# update existing strains (boolean)
+        chunkSizes = None,		# table (or '' for all) -> rows per bcp chunk
+        indexThreshold = 0,		# drop/re-create indexes above this many rows
+        progressInterval = 10,		# seconds between status updates; 0 = off
+        coordinate = False,		# lease key ranges (boolean)
+        blockSize = 100000,		# keys per leased block (integer)
+        analyze = False,		# analyze changed tables after the load (boolean)
+        analyzeFraction = 0.05,		# fraction of a table's rows that must change
+        slowQuery = 0,			# slow query threshold in ms; 0 = off
+        lookupSocket = None,		# strainlookupd.py socket (string)
+        ):
+
+        self.user = user
+        self.passwordFileName = passwordFileName
+        self.inputFileName = inputFileName
+        self.outputDir = outputDir or os.getcwd()
+        self.trace = trace
+        self.profile = profile
+        self.diff = diff
+        self.chunkSizes = chunkSizes or {}
+        self.indexThreshold = indexThreshold
+        self.progressInterval = progressInterval
+        self.coordinate = coordinate
+        self.blockSize = blockSize
+        self.analyze = analyze
+        self.analyzeFraction = analyzeFraction
+        self.slowQuery = slowQuery
+        self.lookupSocket = lookupSocket
+
+    # Purpose: builds a configuration from the load's environment variables
+    # Returns: StrainLoadConfig
+    # Assumes: MGD_DBUSER, MGD_DBPASSWORDFILE, STRAININPUTFILE are set
+    # Effects: nothing
+    # Throws:  KeyError if an environment variable is missing
+
+    @classmethod
+    def fromEnvironment(cls, trace = False, **options):
+
+        return cls(user = os.environ['MGD_DBUSER'],
+                   passwordFileName = os.environ['MGD_DBPASSWORDFILE'],
+                   inputFileName = os.environ['STRAININPUTFILE'],
+                   trace = trace,
+                   **options)
+
+    # Purpose: returns the base name used for the diagnostics/error files
+    # Returns: string
+
+    def logBaseName(self):
+
+        if self.inputFileName is None:
+            return 'strainload'
+
+        head, tail = os.path.split(self.inputFileName)
+        return tail
+
+    # Purpose: returns the full path of an output file
+    # Returns: string
+
+    def outputPath(self, fileName):
+
+        return os.path.join(self.outputDir, fileName)
+
+# Purpose: processes the command line options of the loaders
+# Returns: dictionary of options (option name -> value)
+# Assumes: nothing
+# Effects: nothing
+# Throws: StrainLoadError if the options are invalid
+#
+#	--profile	run the load under cProfile (see strainprofile.py)
+#	--progress=SECONDS
+#			status file update interval (0 = off, see strainprogress.py)
+#	--diff		update existing strains (strainload.py only)
+#	--chunksize=[TABLE:]N
+#			bcp N rows per transaction (for TABLE, or all tables);
+#			may be repeated (strainload.py only)
+#	--indexthreshold=N
+#			drop and re-create the secondary indexes of tables
+#			receiving at least N rows (strainload.py only)
+#	--coordinate	lease key ranges (see strainkeys.py);
+#			not with --indexthreshold
+#	--blocksize=N	keys per leased block (see strainkeys.py)
+#	--analyze	analyze changed tables after the load (strainload.py only)
+#	--analyzefraction=F
+#			fraction of a table's rows that must change
+#			for it to be analyzed (see strainanalyze.py)
+#	--slowquery=MS	report statements taking at least MS milliseconds,
+#			with their plans (see strainslowquery.py)
+#	--lookupd=SOCKET
+#			use the lookup daemon listening on SOCKET
+#			(see strainlookupd.py)
+
+def parseOptions(argv):
+
+    options = {'profile' : False, 'progressInterval' : 10, 'diff' : False, 'chunkSizes' : {}, 'indexThreshold' : 0,
+        'coordinate' : False, 'blockSize' : 100000, 'analyze' : False, 'analyzeFraction' : 0.05,
+        'slowQuery' : 0, 'lookupSocket' : None}
+
+    try:
+        optlist, args = getopt.getopt(argv, '', ['profile', 'progress=', 'diff', 'chunksize=', 'indexthreshold=',
+            'coordinate', 'blocksize=', 'analyze', 'analyzefraction=', 'slowquery=',
+            'lookupd='])
+    except getopt.GetoptError as message:
+        raise StrainLoadError('Usage: %s\n' % (message))
+
+    if len(args) > 0:
+        raise StrainLoadError('Usage: unexpected arguments %s\n' % (' '.join(args)))
+
+    for opt, arg in optlist:
+        if opt == '--profile':
+            options['profile'] = True
+        elif opt == '--progress':
+            options['progressInterval'] = intOption(opt, arg)
+        elif opt == '--diff':
+            options['diff'] = True
+        elif opt == '--chunksize':
+            table, sep, size = arg.rpartition(':')
+            options['chunkSizes'][table] = intOption(opt, size)
+        elif opt == '--indexthreshold':
+            options['indexThreshold'] = intOption(opt, arg)
+        elif opt == '--coordinate':
+            options['coordinate'] = True
+        elif opt == '--blocksize':
+            options['blockSize'] = intOption(opt, arg)
+            if options['blockSize'] <= 0:
+                raise StrainLoadError('Usage: --blocksize must be greater than 0\n')
+        elif opt == '--analyze':
+            options['analyze'] = True
+        elif opt == '--analyzefraction':
+            try:
+                options['analyzeFraction'] = float(arg)
+            except ValueError:
+                raise StrainLoadError('Usage: %s requires a number: %s\n' % (opt, arg))
+        elif opt == '--slowquery':
+            options['slowQuery'] = intOption(opt, arg)
+        elif opt == '--lookupd':
+            options['lookupSocket'] = arg
+
+    # coordinated loaders would race on dropping/re-creating the same indexes
+    if options['coordinate'] and options['indexThreshold'] > 0:
+        raise StrainLoadError('Usage: --indexthreshold cannot be used with --coordinate\n')
+
+    return options
+
+# Purpose: converts the value of a numeric option
+# Returns: integer
+# Throws: StrainLoadError if the value is not a number
+
+def intOption(opt, value):
+
+    try:
+        return int(value)
+    except ValueError:
+        raise StrainLoadError('Usage: %s requires a number: %s\n' % (opt, value))
+
+# Purpose: returns the SQL log settings of a connection, so that a loader
+#	given a caller's connection can restore them (see restoreSqlLog())
+# Returns: (log function, log file descriptor or None if withFD is false)
+
+def sqlLogSettings(db, withFD = True):
+
+    logFD = None
+    if withFD:
+        logFD = getattr(db, 'sqlLogFD', None) or sys.stderr
+
+    return (getattr(db, 'sqlLogFunction', None) or getattr(db, 'sqlLog', None), logFD)
+
+# Purpose: restores the SQL log settings saved by sqlLogSettings()
+# Returns: nothing
+# Effects: sets the log function and file descriptor of the connection
+
+def restoreSqlLog(db, settings):
+
+    logFunction, logFD = settings
+
+    if logFunction is not None:
+        db.set_sqlLogFunction(logFunction)
+
+    if logFD is not None:
+        db.set_sqlLogFD(logFD)
+
+# Purpose: splits a list into batches (for "in (...)"/"values ..." SQL)
+# Returns: iterator of lists
+
+def batches(items, size = 1000):
+
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+class LookupCache:
+    # Is: the lookups shared by the strain loaders
+    # Has: vocabulary, user, strain, accession and allele/marker dictionaries
+    # Does: loads each vocabulary on first use; keeps every positive
+    #	lookup so that a second load with the same cache does not
+    #	repeat the queries
+    #
+    # An orchestrator that runs several loads in-process should create
+    # one LookupCache and pass it to each loader.  Loads run as separate
+    # processes share their lookups through strainlookupd.py (attach()).
+
+    def __init__(self):
+
+        self.speciesDict = {}		# species -> _Term_key (vocab 26)
+        self.strainTypesDict = {}	# strain type -> _Term_key (vocab 55)
+        self.qualifiersDict = {}	# qualifier -> _Term_key (vocab 31)
+        self.strainDict = {}		# strain name -> _Strain_key
+        self.userDict = {}		# login -> _User_key
+        self.objectDict = {}		# (accID, _MGIType_key) -> _Object_key
+        self.termDict = {}		# (term, _Vocab_key) -> _Term_key
+        self.alleleMarkerDict = {}	# _Allele_key -> _Marker_key
+
+        self.client = None		# strainlookupd.LookupClient
+        self.pending = {}		# map name -> entries not yet sent to the daemon
+
+    # Purpose: fills the dictionaries from the lookup daemon
+    # Returns: nothing
+    # Assumes: nothing
+    # Effects: connects to the daemon, or reuses the connection of an
+    #	earlier attach(); strainDict is replaced by the daemon's, which
+    #	has the strains of loads that ran since
+    # Throws: OSError, ValueError if the daemon cannot be reached
+    #	(the database is used from then on)
+
+    def attach(self, socketName = None):
+
+        import strainlookupd
+
+        client = self.client
+        self.client = None
+
+        try:
+            if client is None:
+                client = strainlookupd.LookupClient(socketName)
+            maps = client.request({'op' : 'attach'})['maps']
+        except (OSError, ValueError):
+            if client is not None:
+                client.close()
+            raise
+
+        self.strainDict.clear()
+        for mapName, entries in maps.items():
+            self.mapDict(mapName).update([(strainlookupd.mapKey(k), v) for k, v in entries])
+
+        self.client = client
+
+    # Purpose: returns the dictionary of a daemon map
+    # Returns: dictionary
+
+    def mapDict(self, mapName):
+
+        return {'species' : self.speciesDict, 'strainTypes' : self.strainTypesDict,
+                'qualifiers' : self.qualifiersDict, 'user' : self.userDict,
+                'strain' : self.strainDict, 'object' : self.objectDict,
+                'term' : self.termDict, 'alleleMarker' : self.alleleMarkerDict}[mapName]
+
+    # Purpose: keeps a lookup made by this load for the daemon
+    # Returns: nothing
+    # Effects: sends the kept lookups every 1000 entries
+
+    def remember(self, mapName, key, value):
+
+        if self.client is None:
+            return
+
+        self.pending.setdefault(mapName, []).append((key, value))
+
+        if sum([len(e) for e in self.pending.values()]) >= 1000:
+            self.flush()
+
+    # Purpose: sends a request to the daemon
+    # Returns: nothing
+    # Effects: on error, stops using the daemon (lookups go to the database)
+
+    def send(self, message):
+
+        if self.client is None:
+            return
+
+        try:
+            self.client.request(message)
+        except (OSError, ValueError):
+            self.client.close()
+            self.client = None
+
+    # Purpose: sends the kept lookups to the daemon
+    # Returns: nothing
+
+    def flush(self):
+
+        if self.pending:
+            self.send({'op' : 'put', 'entries' : self.pending})
+            self.pending = {}
+
+    # Purpose: reports the key ranges inserted by a load to the daemon
+    # Returns: nothing
+    # Assumes: the load has been committed
+
+    def report(self, ranges):
+
+        self.flush()
+        self.send({'op' : 'invalidate', 'ranges' : ranges})
+
+    # Purpose: loads a vocabulary dictionary if it is empty
+    # Returns: the dictionary
+    # Assumes: db connection is open
+
+    def loadVocab(self, db, vocabDict, vocabKey):
+
+        if len(vocabDict) == 0:
+            results = db.sql('select _Term_key, term from VOC_Term where _Vocab_key = %d' % (vocabKey), 'auto')
+            for r in results:
+                vocabDict[r['term']] = r['_Term_key']
+                self.remember({26 : 'species', 55 : 'strainTypes', 31 : 'qualifiers'}[vocabKey],
+                    r['term'], r['_Term_key'])
+
+        return vocabDict
+
+    def species(self, db):
+        return self.loadVocab(db, self.speciesDict, 26)
+
+    def strainTypes(self, db):
+        return self.loadVocab(db, self.strainTypesDict, 55)
+
+    def qualifiers(self, db):
+        return self.loadVocab(db, self.qualifiersDict, 31)
+
+    # Purpose: verifies a user, caching the key
+    # Returns: _User_key, or 0 if the user is invalid
+    # Effects: invalid users are written to errorFile by loadlib
+
+    def verifyUser(self, loadlib, createdBy, lineNum, errorFile):
+
+        if createdBy in self.userDict:
+            return self.userDict[createdBy]
+
+        userKey = loadlib.verifyUser(createdBy, lineNum, errorFile)
+        if userKey:
+            self.userDict[createdBy] = userKey
+            self.remember('user', createdBy, userKey)
+
+        return userKey
+
+    # Purpose: verifies an accession id, caching the object key
+    # Returns: _Object_key, or 0/None if the id is invalid
+    # Effects: invalid ids are written to errorFile by loadlib
+
+    def verifyObject(self, loadlib, accID, mgiTypeKey, lineNum, errorFile):
+
+        key = (accID, mgiTypeKey)
+
+        if key in self.objectDict:
+            return self.objectDict[key]
+
+        objectKey = loadlib.verifyObject(accID, mgiTypeKey, None, lineNum, errorFile)
+        if objectKey:
+            self.objectDict[key] = objectKey
+            self.remember('object', key, objectKey)
+
+        return objectKey
+
+    # Purpose: verifies a vocabulary term, caching the term key
+    # Returns: _Term_key, or 0 if the term is invalid
+    # Effects: invalid terms are written to errorFile by loadlib
+
+    def verifyTerm(self, loadlib, term, vocabKey, lineNum, errorFile):
+
+        key = (term, vocabKey)
+
+        if key in self.termDict:
+            return self.termDict[key]
+
+        termKey = loadlib.verifyTerm('', vocabKey, term, lineNum, errorFile)
+        if termKey:
+            self.termDict[key] = termKey
+            self.remember('term', key, termKey)
+
+        return termKey
+
+    # Purpose: resolves an Allele to its Marker
+    # Returns: _Marker_key (may be None), or 0 if the Allele is not found
+
+    def alleleMarker(self, db, alleleKey):
+
+        if alleleKey in self.alleleMarkerDict:
+            return self.alleleMarkerDict[alleleKey]
+
+        results = db.sql('select _Marker_key from ALL_Allele where _Allele_key = %s' % (alleleKey), 'auto')
+        if len(results) == 0:
+            return 0
+
+        markerKey = results[0]['_Marker_key']
+        self.alleleMarkerDict[alleleKey] = markerKey
+        self.remember('alleleMarker', alleleKey, markerKey)
+        return markerKey
+
+# Purpose: turns an open tab-delimited input file into records
+# Returns: iterator of records (list of string tokens)
+# Assumes: nothing
+# Effects: reads inputFile
+# Throws:  nothing
+
+def readRecords(inputFile):
+
+    for line in inputFile:
+        if line[-1:] == CRT:
+            line = line[:-1]
+        yield line.split(TAB)
+
+
+class RecordReader:
+    # Is: the records of one input file
+    # Has: the open file and the number of logical columns
+    # Does: iterates over the records of:
+    #	- a plain tab-delimited file, scanned through mmap and decoded
+    #	  a block at a time rather than line by line
+    #	- a gzip (.gz), bzip2 (.bz2) or xz (.xz) tab-delimited file,
+    #	  decompressed as a stream
+    #	- a Parquet (.parquet, .pq) or Arrow IPC/Feather (.arrow,
+    #	  .feather, .ipc) file whose first numFields columns are the
+    #	  fields of the tab-delimited format, in the same order
+    #	  (requires pyarrow)
+    #
+    # Records are lists of strings, as returned by readRecords();
+    # null columnar values are returned as ''.
+
+    def __init__(self,
+        fileName,	# input file (string)
+        numFields,	# number of logical columns (integer)
+        ):
+
+        self.fileName = fileName
+        self.numFields = numFields
+        self.file = None
+        self.rawFile = None
+        self.size = 0
+        self.position = 0
+
+        root, suffix = os.path.splitext(fileName)
+        suffix = suffix.lower()
+
+        try:
+            self.rawFile = open(fileName, 'rb')
+            self.size = os.fstat(self.rawFile.fileno()).st_size
+            if suffix in compressedSuffixes:
+                module = __import__(compressedSuffixes[suffix])
+                self.file = module.open(self.rawFile, 'rt')
+                self.format = 'compressed'
+            elif suffix in parquetSuffixes or suffix in arrowSuffixes:
+                self.file = self.rawFile
+                self.format = 'parquet' if suffix in parquetSuffixes else 'arrow'
+            else:
+                self.file = self.rawFile
+                self.format = 'plain'
+        except OSError:
+            raise StrainLoadError('Could not open file %s\n' % fileName)
+
+    def __iter__(self):
+
+        if self.format == 'compressed':
+            return readRecords(self.file)
+        elif self.format == 'plain':
+            return self.mappedRecords()
+        else:
+            return self.columnarRecords()
+
+    def close(self):
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        if self.rawFile is not None:
+            self.rawFile.close()
+            self.rawFile = None
+
+    # Purpose: returns how much of the input file has been read
+    # Returns: fraction (0..1), or None if unknown (columnar input)
+
+    def fraction(self):
+
+        if self.size == 0 or self.format in ('parquet', 'arrow'):
+            return None
+
+        if self.format == 'compressed':
+            try:
+                return self.rawFile.tell() / self.size
+            except (ValueError, AttributeError):
+                return None
+
+        return self.position / self.size
+
+    # Purpose: scans a plain file through mmap
+    # Returns: iterator of records
+    # Assumes: nothing
+    # Effects: maps the input file
+    # Throws: nothing
+
+    def mappedRecords(self):
+
+        encoding = locale.getpreferredencoding(False)
+        size = self.size
+
+        if size == 0:
+            return
+
+        with mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ) as m:
+
+            start = 0
+
+            while start < size:
+
+                # decode up to the last full line of the next block
+
+                end = start + blockSize
+                if end >= size:
+                    end = size
+                else:
+                    newline = m.find(b'\n', end - 1)
+                    end = size if newline < 0 else newline + 1
+
+                # universal newlines, as text mode reads the file;
+                # a block ends after a newline, so no CRLF is split
+                text = m[start:end].decode(encoding)
+                lines = text.replace('\r\n', CRT).replace('\r', CRT).split(CRT)
+
+                # a block ends with a newline, except possibly the last one
+                if lines[-1] == '':
+                    lines.pop()
+
+                for line in lines:
+                    yield line.split(TAB)
+
+                start = end
+                self.position = end
+
+    # Purpose: reads a Parquet or Arrow file a batch at a time
+    # Returns: iterator of records
+    # Assumes: pyarrow is installed
+    # Effects: nothing
+    # Throws: StrainLoadError if pyarrow is missing or the file
+    #	has fewer than numFields columns
+
+    def columnarRecords(self):
+
+        try:
+            import pyarrow
+            if self.format == 'parquet':
+                import pyarrow.parquet
+            else:
+                import pyarrow.ipc
+        except ImportError:
+            raise StrainLoadError('pyarrow is required to read %s\n' % self.fileName)
+
+        if self.format == 'parquet':
+            source = pyarrow.parquet.ParquetFile(self.file)
+            numColumns = len(source.schema_arrow)
+            # only the load's fields are decoded
+            batches = source.iter_batches(batch_size = batchSize,
+                columns = source.schema_arrow.names[:self.numFields])
+        else:
+            try:
+                source = pyarrow.ipc.open_file(self.file)
+                batches = (source.get_batch(i) for i in range(source.num_record_batches))
+            except pyarrow.ArrowInvalid:
+                self.file.seek(0)
+                source = pyarrow.ipc.open_stream(self.file)
+                batches = source
+            numColumns = len(source.schema)
+
+        if numColumns < self.numFields:
+            raise StrainLoadError('Invalid File %s: %d columns, expected %d\n' \
+                % (self.fileName, numColumns, self.numFields))
+
+        for batch in batches:
+            columns = [batch.column(i).to_pylist() for i in range(self.numFields)]
+            for row in zip(*columns):
+                yield [columnValue(v) for v in row]
+
+# Purpose: converts a columnar value to its tab-delimited form
+# Returns: string
+
+def columnValue(v):
+
+    if v is None:
+        return ''
+    if v is True or v is False:
+        return '%d' % v
+    # key columns written by float-typed writers (ex. 22.0 -> '22')
+    if isinstance(v, float) and v.is_integer():
+        return '%d' % v
+    return str(v)
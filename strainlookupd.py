@@ -0,0 +1,443 @@
+
+#
+# Program: strainlookupd.py
+#
+# Purpose:
+#
+#	Lookup daemon shared by successive strainload.py and
+#	strainalleleload.py runs (the --lookupd=SOCKET option of the
+#	loaders).
+#
+#	The daemon keeps warm maps of:
+#
+#	species, strainTypes, qualifiers	term -> _Term_key (vocabs 26, 55, 31)
+#	user		login -> _User_key
+#	strain		strain name -> _Strain_key
+#	object		(accID, _MGIType_key) -> _Object_key
+#	term		(term, _Vocab_key) -> _Term_key
+#	alleleMarker	_Allele_key -> _Marker_key
+#
+#	The vocabularies, users and strain names are read whole at start;
+#	the other maps hold what the loaders looked up (put).  A loader
+#	gets all maps with one request when it starts (attach), so it
+#	skips nearly all cache-warming queries, and sends back the
+#	lookups it had to make in batches.  The strain map may miss
+#	strains committed out of key order or dated at midnight, so
+#	strainload.py checks the input names missing from it with one
+#	PRB_Strain query per batch of names, instead of one per record.
+#
+#	The maps are kept current:
+#
+#	- before each attach and every --refresh seconds (default 60),
+#	  rows with keys above the highest key seen, or modified since
+#	  the last refresh, are read from PRB_Strain, MGI_User, VOC_Term
+#	  and ACC_Accession (ACC_Accession by key only), and the cached
+#	  Alleles modified since are read again from ALL_Allele
+#
+#	- after its bcp, each load reports the key ranges it inserted
+#	  (invalidate); the daemon reads those PRB_Strain rows and drops
+#	  the object entries of those ACC_Accession rows at once
+#
+#	Deleted rows and accession ids changed in place by other programs
+#	are not seen; restart the daemon after such edits.
+#
+#	Protocol: one JSON object per line each way.
+#
+#	{"op": "attach"}			-> {"maps": {map: [[key, value], ...]}}
+#	{"op": "put", "entries": {map: [[key, value], ...]}}	-> {"ok": true}
+#	{"op": "invalidate", "ranges": {table: [first, last]}}	-> {"ok": true}
+#	{"op": "stats"}				-> {"maps": {map: size}, ...}
+#
+#	Composite keys are sent as lists (ex. ["MGI:12345", 11]).
+#
+# Usage:
+#	strainlookupd.py --socket=PATH [--refresh=SECONDS]
+#
+# Envvars:
+#
+#	MGD_DBUSER
+#	MGD_DBPASSWORDFILE
+#
+# History
+#
+
+import sys
+import os
+import json
+import time
+import getopt
+import socket
+import socketserver
+import threading
+
+defaultRefresh = 60	# seconds between refreshes
+defaultTimeout = 60	# seconds a loader waits for a reply before using the database
+
+vocabMaps = {'species' : 26, 'strainTypes' : 55, 'qualifiers' : 31}
+mapNames = ('species', 'strainTypes', 'qualifiers', 'user', 'strain', 'object', 'term', 'alleleMarker')
+
+# Purpose: converts a JSON key back into a map key
+# Returns: string, integer or tuple
+
+def mapKey(key):
+
+    if isinstance(key, list):
+        return tuple(key)
+
+    return key
+
+class LookupClient:
+    # Is: a loader's connection to the daemon
+    # Has: the socket and its file
+    # Does: request() sends one request and returns the reply
+
+    def __init__(self, socketName, timeout = defaultTimeout):
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # a hung daemon raises socket.timeout (an OSError) instead of
+        # blocking the load
+        self.socket.settimeout(timeout)
+        self.socket.connect(socketName)
+        self.file = self.socket.makefile('rw')
+
+    # Purpose: sends one request
+    # Returns: the reply (dictionary)
+    # Throws: OSError, ValueError if the daemon is gone or the reply is bad
+
+    def request(self, message):
+
+        self.file.write(json.dumps(message) + '\n')
+        self.file.flush()
+        reply = self.file.readline()
+
+        if not reply:
+            raise OSError('lookup daemon closed the connection')
+
+        reply = json.loads(reply)
+        if 'error' in reply:
+            raise ValueError(reply['error'])
+
+        return reply
+
+    def close(self):
+
+        try:
+            self.file.close()
+            self.socket.close()
+        except OSError:
+            pass
+
+class LookupServer:
+    # Is: the maps of the daemon
+    # Has: the connection, the maps, the highest keys seen,
+    #	the time of the last refresh
+    # Does: load(), refresh(), handle() (attach, put, invalidate, stats)
+    #
+    # All access to the maps and the connection holds self.lock.
+    #
+    # The ranges reported by coordinated loads may be committed out of
+    # key order, so reading a reported range does not move the highest
+    # key seen.
+
+    def __init__(self, db):
+
+        self.db = db
+        self.lock = threading.Lock()
+        self.maps = dict([(m, {}) for m in mapNames])
+        self.names = {'strain' : {}, 'user' : {}, 'term' : {}}	# key -> name, to drop renamed names
+        self.maxKeys = {'PRB_Strain' : 0, 'MGI_User' : 0, 'VOC_Term' : 0, 'ACC_Accession' : 0}
+        self.lastRefresh = None		# database time of the last refresh (string)
+        self.requests = 0
+
+    # Purpose: returns the current database time
+    # Returns: string
+
+    def now(self):
+
+        return str(self.db.sql('select now() as now', 'auto')[0]['now'])
+
+    # Purpose: ends the connection's transaction after a failed query,
+    #	so that later requests are not refused by an aborted transaction
+    # Returns: nothing
+
+    def rollback(self):
+
+        try:
+            if hasattr(self.db, 'rollback'):
+                self.db.rollback()
+            else:
+                self.db.sql('rollback', None)
+        except Exception as message:
+            log('rollback failed: %s' % (message))
+
+    # Purpose: sets a name of a map read whole, dropping its old name
+    # Returns: nothing
+
+    def setName(self, mapName, namesName, key, name):
+
+        names = self.names[namesName]
+        oldName = names.get(key)
+
+        if oldName is not None and oldName != name:
+            self.maps[mapName].pop(oldName, None)
+
+        names[key] = name
+        self.maps[mapName][name] = key
+
+    # Purpose: reads the maps that are kept whole
+    # Returns: nothing
+    # Effects: queries the database
+
+    def load(self):
+
+        with self.lock:
+            self.lastRefresh = self.now()
+            self.readStrains('true')
+            self.readUsers('true')
+            self.readTerms('_Vocab_key in (%s)' % (','.join(['%d' % (v) for v in vocabMaps.values()])))
+            for table, keyColumn in (('VOC_Term', '_Term_key'), ('ACC_Accession', '_Accession_key')):
+                results = self.db.sql('select coalesce(max(%s), 0) as maxKey from %s' % (keyColumn, table), 'auto')
+                self.maxKeys[table] = results[0]['maxKey']
+            self.db.commit()
+
+    # Purpose: reads PRB_Strain rows into the strain map
+    # Returns: nothing
+
+    def readStrains(self, where, track = True):
+
+        results = self.db.sql('select _Strain_key, strain from PRB_Strain where %s' % (where), 'auto')
+
+        for r in results:
+            self.setName('strain', 'strain', r['_Strain_key'], r['strain'])
+            if track:
+                self.maxKeys['PRB_Strain'] = max(self.maxKeys['PRB_Strain'], r['_Strain_key'])
+
+    # Purpose: reads MGI_User rows into the user map
+    # Returns: nothing
+
+    def readUsers(self, where):
+
+        results = self.db.sql('select _User_key, login from MGI_User where %s' % (where), 'auto')
+
+        for r in results:
+            self.setName('user', 'user', r['_User_key'], r['login'])
+            self.maxKeys['MGI_User'] = max(self.maxKeys['MGI_User'], r['_User_key'])
+
+    # Purpose: reads VOC_Term rows into the vocabulary maps
+    # Returns: nothing
+
+    def readTerms(self, where):
+
+        vocabs = dict([(v, m) for m, v in vocabMaps.items()])
+        results = self.db.sql('''
+            select _Term_key, _Vocab_key, term from VOC_Term where %s
+            ''' % (where), 'auto')
+
+        for r in results:
+            # a changed term is looked up again by the next load
+            self.maps['term'].pop((r['term'], r['_Vocab_key']), None)
+            if r['_Vocab_key'] in vocabs:
+                self.setName(vocabs[r['_Vocab_key']], 'term', r['_Term_key'], r['term'])
+            self.maxKeys['VOC_Term'] = max(self.maxKeys['VOC_Term'], r['_Term_key'])
+
+    # Purpose: drops the object entries of a range of ACC_Accession rows
+    # Returns: nothing
+
+    def readAccessions(self, firstKey, lastKey = None):
+
+        where = '_Accession_key >= %d' % (firstKey)
+        track = lastKey is None
+        if not track:
+            where = where + ' and _Accession_key <= %d' % (lastKey)
+
+        results = self.db.sql('select _Accession_key, accID, _MGIType_key from ACC_Accession where %s' % (where), 'auto')
+
+        for r in results:
+            self.maps['object'].pop((r['accID'], r['_MGIType_key']), None)
+            if track:
+                self.maxKeys['ACC_Accession'] = max(self.maxKeys['ACC_Accession'], r['_Accession_key'])
+
+    # Purpose: reads the Allele/Marker entries of cached Alleles modified since
+    # Returns: nothing
+
+    def readAlleles(self, since):
+
+        alleleMarker = self.maps['alleleMarker']
+        alleleKeys = list(alleleMarker)
+
+        for i in range(0, len(alleleKeys), 1000):
+            results = self.db.sql('''
+                select _Allele_key, _Marker_key from ALL_Allele
+                where modification_date >= '%s' and _Allele_key in (%s)
+                ''' % (since, ','.join(['%d' % (k) for k in alleleKeys[i:i + 1000]])), 'auto')
+            for r in results:
+                alleleMarker[r['_Allele_key']] = r['_Marker_key']
+
+    # Purpose: reads the rows added or modified since the last refresh
+    # Returns: nothing
+    # Assumes: self.lock is held
+    # Effects: queries the database
+
+    def refresh(self):
+
+        since = self.lastRefresh
+        now = self.now()
+
+        self.readStrains("_Strain_key > %d or modification_date >= '%s'" % (self.maxKeys['PRB_Strain'], since))
+        self.readUsers("_User_key > %d or modification_date >= '%s'" % (self.maxKeys['MGI_User'], since))
+        self.readTerms("_Term_key > %d or modification_date >= '%s'" % (self.maxKeys['VOC_Term'], since))
+        self.readAccessions(self.maxKeys['ACC_Accession'] + 1)
+        self.readAlleles(since)
+        self.db.commit()
+
+        # after a failed refresh, the next one starts from the same time
+        self.lastRefresh = now
+
+    # Purpose: answers a request
+    # Returns: the reply (dictionary)
+    # Throws: the error of a failed query, after rolling back
+
+    def handle(self, message):
+
+        with self.lock:
+            try:
+                return self.answer(message)
+            except Exception:
+                self.rollback()
+                raise
+
+    # Purpose: answers a request
+    # Returns: the reply (dictionary)
+    # Assumes: self.lock is held
+
+    def answer(self, message):
+
+        op = message.get('op')
+
+        self.requests = self.requests + 1
+
+        if op == 'attach':
+            self.refresh()
+            return {'maps' : dict([(m, list(self.maps[m].items())) for m in mapNames])}
+
+        if op == 'put':
+            for m, entries in message['entries'].items():
+                if m in self.maps:
+                    for key, value in entries:
+                        self.maps[m][mapKey(key)] = value
+            return {'ok' : True}
+
+        if op == 'invalidate':
+            for table, (firstKey, lastKey) in message['ranges'].items():
+                if table == 'PRB_Strain':
+                    self.readStrains('_Strain_key between %d and %d' % (firstKey, lastKey), False)
+                elif table == 'ACC_Accession':
+                    self.readAccessions(firstKey, lastKey)
+            self.db.commit()
+            return {'ok' : True}
+
+        if op == 'stats':
+            return {'maps' : dict([(m, len(self.maps[m])) for m in mapNames]),
+                    'requests' : self.requests, 'lastRefresh' : self.lastRefresh}
+
+        return {'error' : 'unknown op: %s' % (op)}
+
+    # Purpose: the refresh thread
+    # Returns: nothing
+    # Effects: refreshes the maps every interval seconds
+
+    def refreshLoop(self, interval):
+
+        while True:
+            time.sleep(interval)
+            with self.lock:
+                try:
+                    self.refresh()
+                except Exception as message:
+                    log('refresh failed: %s' % (message))
+                    self.rollback()
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+
+        for line in self.rfile:
+            try:
+                reply = self.server.lookups.handle(json.loads(line))
+            except Exception as message:
+                reply = {'error' : str(message)}
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+
+class LookupSocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+def log(message):
+
+    sys.stdout.write('%s %s\n' % (time.strftime('%m/%d/%Y %H:%M:%S'), message))
+    sys.stdout.flush()
+
+# Purpose: removes the socket file of a daemon that is no longer running
+# Returns: nothing
+# Throws: SystemExit if another daemon is listening on the socket
+
+def removeStaleSocket(socketName):
+
+    if not os.path.exists(socketName):
+        return
+
+    try:
+        LookupClient(socketName).close()
+    except OSError:
+        os.remove(socketName)
+        return
+
+    sys.stderr.write('A lookup daemon is already listening on %s\n' % (socketName))
+    sys.exit(1)
+
+if __name__ == '__main__':
+
+    import db
+
+    socketName = None
+    interval = defaultRefresh
+
+    try:
+        optlist, args = getopt.getopt(sys.argv[1:], '', ['socket=', 'refresh='])
+        for opt, arg in optlist:
+            if opt == '--socket':
+                socketName = arg
+            elif opt == '--refresh':
+                interval = int(arg)
+    except (getopt.GetoptError, ValueError) as message:
+        sys.stderr.write('Usage: %s\n' % (message))
+        sys.exit(1)
+
+    if socketName is None:
+        sys.stderr.write('Usage: strainlookupd.py --socket=PATH [--refresh=SECONDS]\n')
+        sys.exit(1)
+
+    db.useOneConnection(1)
+    db.set_sqlUser(os.environ['MGD_DBUSER'])
+    db.set_sqlPasswordFromFile(os.environ['MGD_DBPASSWORDFILE'])
+
+    lookups = LookupServer(db)
+    lookups.load()
+    log('loaded: %s' % (lookups.handle({'op' : 'stats'})))
+
+    removeStaleSocket(socketName)
+    server = LookupSocketServer(socketName, RequestHandler)
+    server.lookups = lookups
+
+    threading.Thread(target = lookups.refreshLoop, args = (interval,), daemon = True).start()
+    log('listening on %s' % (socketName))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socketName)
+        db.useOneConnection(0)
+
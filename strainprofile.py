@@ -0,0 +1,127 @@
+
+#
+# Program: strainprofile.py
+#
+# Purpose:
+#
+#	Runs a strain load under cProfile (the --profile option of
+#	strainload.py and strainalleleload.py) and writes, next to the
+#	diagnostics file:
+#
+#	<input>.<date>.profile		pstats file (python -m pstats)
+#	<input>.<date>.profile.txt	top functions by cumulative time,
+#					grouped as SQL, I/O or Python CPU
+#
+#	Nothing here is imported or run unless --profile is given.
+#
+# History
+#
+
+import os
+import cProfile
+import pstats
+
+SQL = 'SQL'
+IO = 'I/O'
+CPU = 'Python CPU'
+
+topFunctions = 30	# number of functions listed in the summary
+
+# modules whose time is spent waiting on the database
+sqlModules = ('db.py', 'pg_db.py')
+sqlPackages = ('psycopg', 'pgdb')
+
+# builtins whose time is spent on files/processes
+ioFunctions = ("'write'", "'read'", "'readline'", "'readlines'", "'flush'", "'close'",
+               'posix.system', 'io.open', 'built-in function open')
+ioModules = ('gzip.py', 'bz2.py', 'lzma.py', '_compression.py', 'subprocess.py')
+
+# Purpose: classifies a profiled function
+# Returns: SQL, IO or CPU
+# Assumes: nothing
+# Effects: nothing
+# Throws: nothing
+
+def category(
+    func	# pstats function key (filename, lineno, funcname)
+    ):
+
+    fileName, lineNum, funcName = func
+    baseName = os.path.basename(fileName)
+
+    if baseName in sqlModules:
+        return SQL
+
+    for p in sqlPackages:
+        if p in fileName or p in funcName:
+            return SQL
+
+    if baseName in ioModules:
+        return IO
+
+    for f in ioFunctions:
+        if f in funcName:
+            return IO
+
+    return CPU
+
+# Purpose: writes the text summary of a profile
+# Returns: nothing
+# Assumes: nothing
+# Effects: writes to summaryFile
+# Throws: nothing
+
+def writeSummary(
+    stats,		# pstats.Stats
+    summaryFile		# file descriptor
+    ):
+
+    # exclusive (own) time per category adds up to the total run time
+
+    totals = {SQL : 0.0, IO : 0.0, CPU : 0.0}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        totals[category(func)] += tt
+
+    total = sum(totals.values()) or 1.0
+
+    summaryFile.write('Total time: %.3f sec\n\n' % (stats.total_tt))
+    summaryFile.write('Own time by category:\n\n')
+    for c in (SQL, IO, CPU):
+        summaryFile.write('%-12s %10.3f sec %5.1f%%\n' % (c, totals[c], 100.0 * totals[c] / total))
+
+    summaryFile.write('\nTop %d functions by cumulative time:\n\n' % (topFunctions))
+    summaryFile.write('%-12s %10s %10s %10s  %s\n' % ('category', 'calls', 'cumtime', 'tottime', 'function'))
+
+    byCumulative = sorted(stats.stats.items(), key = lambda i: i[1][3], reverse = True)
+
+    for func, (cc, nc, tt, ct, callers) in byCumulative[:topFunctions]:
+        fileName, lineNum, funcName = func
+        if fileName == '~':
+            where = funcName
+        else:
+            where = '%s:%d(%s)' % (os.path.basename(fileName), lineNum, funcName)
+        summaryFile.write('%-12s %10d %10.3f %10.3f  %s\n' % (category(func), nc, ct, tt, where))
+
+# Purpose: runs func(*args) under cProfile
+# Returns: the return value of func
+# Assumes: nothing
+# Effects: writes <baseName>.profile and <baseName>.profile.txt
+# Throws: whatever func throws (the profile is still written)
+
+def run(
+    baseName,	# file name without suffix (string)
+    func,	# the function to profile
+    *args
+    ):
+
+    profiler = cProfile.Profile()
+
+    try:
+        return profiler.runcall(func, *args)
+    finally:
+        profileFileName = baseName + '.profile'
+        profiler.dump_stats(profileFileName)
+
+        with open(profileFileName + '.txt', 'w') as summaryFile:
+            writeSummary(pstats.Stats(profiler), summaryFile)
+
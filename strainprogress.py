@@ -0,0 +1,189 @@
+
+#
+# Program: strainprogress.py
+#
+# Purpose:
+#
+#	Live progress of a strain load.
+#
+#	A background thread rewrites <input>.<date>.status, next to the
+#	diagnostics file, every --progress seconds (default 10) with:
+#	current phase, lines processed, valid and rejected lines, rows
+#	per output table, overall and recent lines/sec, and an ETA when
+#	the input size is known.
+#
+#	"kill -USR1 <pid>" writes the same snapshot to the status file
+#	and stderr at once.  SIGUSR1 is received by the reporter thread
+#	(sigtimedwait), so it is answered even while the load is
+#	blocked in a query; a phase that does not move between
+#	snapshots, with a recent rate of 0, is the sign of a stuck load.
+#
+#	The loaders only update counters they already keep, so the
+#	cost per input line is nil; the thread does the rest.
+#
+# History
+#
+
+import os
+import sys
+import time
+import signal
+import threading
+
+defaultInterval = 10	# seconds between status file updates
+
+class Progress:
+    # Is: the progress reporter of one load
+    # Has: the status file name, the snapshot function of the loader,
+    #	the current phase, the reporter thread
+    # Does: start(), setPhase(), stop()
+    #
+    # snapshotFunc() returns a dictionary:
+    #	lines		lines processed (integer)
+    #	rejected	lines rejected (integer)
+    #	rows		table name -> rows written (dictionary)
+    #	fraction	fraction of the input read, or None if unknown
+
+    def __init__(self,
+        statusFileName,		# status file (string)
+        snapshotFunc,		# returns the loader's counters
+        interval = defaultInterval,	# seconds between updates (integer)
+        ):
+
+        self.statusFileName = statusFileName
+        self.snapshotFunc = snapshotFunc
+        self.interval = interval
+        self.phase = 'init'
+        self.startTime = time.time()
+        self.lastTime = self.startTime
+        self.lastLines = 0
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.lock = threading.Lock()
+        self.sigmask = None
+
+    # Purpose: starts the reporter thread
+    # Returns: nothing
+    # Assumes: called from the thread running the load
+    # Effects: blocks SIGUSR1 in this thread (restored by stop())
+    #	so that the reporter thread receives it
+    # Throws: nothing
+
+    def start(self):
+
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            self.sigmask = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+
+        self.thread = threading.Thread(target = self.run, name = 'strainprogress', daemon = True)
+        self.thread.start()
+        self.write()
+
+    # Purpose: sets the current phase of the load
+    # Returns: nothing
+    # Effects: rewrites the status file
+
+    def setPhase(self, phase):
+
+        self.phase = phase
+        self.write()
+
+    # Purpose: stops the reporter thread, writes the final snapshot
+    # Returns: nothing
+    # Effects: restores the SIGUSR1 mask
+
+    def stop(self, phase = 'done'):
+
+        self.stopEvent.set()
+
+        if self.thread is not None:
+            # wake the thread from sigtimedwait()
+            if self.sigmask is not None:
+                signal.pthread_kill(self.thread.ident, signal.SIGUSR1)
+            self.thread.join()
+            self.thread = None
+
+        if self.sigmask is not None:
+            signal.pthread_sigmask(signal.SIG_SETMASK, self.sigmask)
+            self.sigmask = None
+
+        self.setPhase(phase)
+
+    # Purpose: the reporter thread
+    # Returns: nothing
+    # Effects: writes the status file every interval seconds,
+    #	and to stderr on SIGUSR1
+
+    def run(self):
+
+        while not self.stopEvent.is_set():
+
+            if self.sigmask is not None:
+                received = signal.sigtimedwait({signal.SIGUSR1}, self.interval)
+            else:
+                received = None
+                self.stopEvent.wait(self.interval)
+
+            if self.stopEvent.is_set():
+                break
+
+            text = self.write()
+
+            if received is not None:
+                sys.stderr.write(text)
+                sys.stderr.flush()
+
+    # Purpose: formats the current snapshot
+    # Returns: string
+
+    def format(self):
+
+        now = time.time()
+        snapshot = self.snapshotFunc()
+        lines = snapshot['lines']
+        rejected = snapshot['rejected']
+        elapsed = now - self.startTime
+
+        rate = lines / elapsed if elapsed > 0 else 0.0
+        recent = (lines - self.lastLines) / (now - self.lastTime) if now > self.lastTime else 0.0
+        self.lastTime = now
+        self.lastLines = lines
+
+        text = []
+        text.append('Date/Time: %s\n' % (time.strftime('%m/%d/%Y %H:%M:%S', time.localtime(now))))
+        text.append('PID: %d\n' % (os.getpid()))
+        text.append('Phase: %s\n' % (self.phase))
+        text.append('Elapsed: %d sec\n' % (elapsed))
+        text.append('Lines processed: %d\n' % (lines))
+        text.append('Lines valid: %d\n' % (lines - rejected))
+        text.append('Lines rejected: %d\n' % (rejected))
+        text.append('Lines/sec (overall): %.1f\n' % (rate))
+        text.append('Lines/sec (recent): %.1f\n' % (recent))
+
+        fraction = snapshot.get('fraction')
+        if fraction:
+            text.append('Input read: %.1f%%\n' % (100.0 * fraction))
+            text.append('ETA: %d sec\n' % (elapsed * (1.0 - fraction) / fraction))
+
+        for table, rows in snapshot['rows'].items():
+            text.append('Rows %s: %d\n' % (table, rows))
+
+        return ''.join(text)
+
+    # Purpose: rewrites the status file with the current snapshot
+    # Returns: the snapshot text
+    # Effects: replaces the status file (write + rename)
+
+    def write(self):
+
+        with self.lock:
+            text = self.format()
+            tmpFileName = self.statusFileName + '.tmp'
+            try:
+                with open(tmpFileName, 'w') as statusFile:
+                    statusFile.write(text)
+                os.replace(tmpFileName, self.statusFileName)
+            except OSError:
+                pass
+
+        return text
+
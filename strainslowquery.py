@@ -0,0 +1,182 @@
+
+#
+# Program: strainslowquery.py
+#
+# Purpose:
+#
+#	Slow query capture (the --slowquery=MS option of the loaders).
+#
+#	While installed, every db.sql() call (including those made by
+#	loadlib) is timed.  A statement that takes at least MS
+#	milliseconds is written to <input>.<date>.slowqueries, next to
+#	the diagnostics file, with:
+#
+#	- its template: the statement with its literals replaced by
+#	  $1, $2, ... so that per-row statements group together
+#	- its parameters: the literals that were replaced
+#	- its plan: "explain (analyze, buffers)" for a select without
+#	  visible side effects, plain "explain" for anything else (delete,
+#	  update, nextval(), setval(), advisory locks, ACC_setMax)
+#
+#	The file ends with a summary per template: count, total and
+#	maximum time.  Explains run in a savepoint that is always rolled
+#	back, so neither a failed explain nor whatever an analyzed
+#	statement changes is kept.  (Session-level effects that a
+#	rollback cannot undo, such as nextval(), are why those statements
+#	are only explained.)
+#
+#	Nothing is wrapped unless --slowquery is given.
+#
+# History
+#
+
+import re
+import time
+
+# literals: quoted strings and numbers that are not part of a name
+literalRE = re.compile(r"'(?:[^']|'')*'|(?<![\w.$])-?\d+(?:\.\d+)?(?![\w.])")
+
+# statements that are only explained, not run again by "explain analyze"
+# (stored procedures: ACC_setMax, ACC_insert, ...)
+sideEffectRE = re.compile(r'nextval|setval|advisory|_set|_insert|_update|_delete|\breturning\b|\binto\b', re.IGNORECASE)
+selectRE = re.compile(r'\s*(select|with)\b', re.IGNORECASE)
+
+# Purpose: splits a statement into its template and parameters
+# Returns: (template, list of parameters)
+
+def normalize(command):
+
+    params = []
+
+    def replace(m):
+        params.append(m.group(0))
+        return '$%d' % (len(params))
+
+    template = literalRE.sub(replace, ' '.join(command.split()))
+    return template, params
+
+class SlowQueryLog:
+    # Is: the slow query capture of one load
+    # Has: the connection (db module), the report file, the threshold,
+    #	the original db.sql, statistics per template
+    # Does: install() wraps db.sql; uninstall() restores it and writes
+    #	the summary
+
+    def __init__(self,
+        db,			# db module
+        reportFileName,		# report file (string)
+        threshold,		# milliseconds (integer)
+        ):
+
+        self.db = db
+        self.reportFileName = reportFileName
+        self.threshold = threshold / 1000.0
+        self.sql = None		# the original db.sql
+        self.reportFile = None
+        self.templates = {}	# template -> [count, total seconds, max seconds]
+        self.count = 0
+
+    # Purpose: wraps db.sql
+    # Returns: nothing
+    # Effects: replaces db.sql; opens the report file
+
+    def install(self):
+
+        self.reportFile = open(self.reportFileName, 'w')
+        self.reportFile.write('Slow query threshold: %d ms\n\n' % (self.threshold * 1000))
+        self.sql = self.db.sql
+        self.db.sql = self.timedSql
+
+    # Purpose: restores db.sql, writes the summary
+    # Returns: nothing
+    # Effects: closes the report file
+
+    def uninstall(self):
+
+        if self.sql is None:
+            return
+
+        self.db.sql = self.sql
+        self.sql = None
+
+        self.reportFile.write('Summary: %d slow statements\n\n' % (self.count))
+        self.reportFile.write('%8s %12s %12s  %s\n' % ('count', 'total ms', 'max ms', 'template'))
+
+        byTotal = sorted(self.templates.items(), key = lambda i: i[1][1], reverse = True)
+        for template, (count, total, longest) in byTotal:
+            self.reportFile.write('%8d %12.1f %12.1f  %s\n' % (count, total * 1000, longest * 1000, template))
+
+        self.reportFile.close()
+        self.reportFile = None
+
+    # Purpose: db.sql, timed
+    # Returns: the result of db.sql
+    # Effects: records the statement if it is slow
+
+    def timedSql(self, command, *args, **kwargs):
+
+        startTime = time.time()
+        results = self.sql(command, *args, **kwargs)
+        elapsed = time.time() - startTime
+
+        if elapsed >= self.threshold:
+            self.record(command, elapsed)
+
+        return results
+
+    # Purpose: writes one slow statement to the report file
+    # Returns: nothing
+    # Effects: runs explain; updates the statistics per template
+
+    def record(self, command, elapsed):
+
+        if isinstance(command, str):
+            template, params = normalize(command)
+            plan = self.explain(command)
+        else:
+            # a list of statements
+            template, params = normalize('; '.join(command))
+            plan = ['(no plan for a list of statements)']
+
+        self.count = self.count + 1
+        stats = self.templates.setdefault(template, [0, 0.0, 0.0])
+        stats[0] = stats[0] + 1
+        stats[1] = stats[1] + elapsed
+        stats[2] = max(stats[2], elapsed)
+
+        self.reportFile.write('Time: %.1f ms\n' % (elapsed * 1000))
+        self.reportFile.write('Template: %s\n' % (template))
+        self.reportFile.write('Parameters: %s\n' % (', '.join(params)))
+        self.reportFile.write('Plan:\n')
+        for line in plan:
+            self.reportFile.write('    %s\n' % (line))
+        self.reportFile.write('\n')
+        self.reportFile.flush()
+
+    # Purpose: returns the plan of a statement
+    # Returns: list of plan lines
+
+    def explain(self, command):
+
+        if selectRE.match(command) and not sideEffectRE.search(command):
+            explain = 'explain (analyze, buffers) ' + command
+        else:
+            explain = 'explain ' + command
+
+        try:
+            self.sql('savepoint slowquery', None)
+        except Exception as message:
+            return ['(no plan: %s)' % (str(message).strip())]
+
+        try:
+            results = self.sql(explain, 'auto')
+            plan = [list(r.values())[0] for r in results]
+        except Exception as message:
+            plan = ['(no plan: %s)' % (str(message).strip())]
+
+        # undo whatever the analyzed statement changed
+        self.sql('rollback to savepoint slowquery', None)
+        self.sql('release savepoint slowquery', None)
+
+        return plan
+